@@ -1,6 +1,6 @@
 'use server'
 
-import { getImages as dbGetImages, getImageById, addImage, updateImage, deleteImage } from "@/lib/db"
+import { getImages as dbGetImages, getImagesPage, getImageById, addImage, updateImage, deleteImage } from "@/lib/db"
 
 // Server action to get all images
 export async function getImages(search?: string) {
@@ -29,6 +29,17 @@ export async function getImages(search?: string) {
   }
 }
 
+// Server action to get one page of the image list: list columns and a text snippet
+// instead of every row with its full extracted text
+export async function getImageListPage(search?: string, cursor?: string | null) {
+  try {
+    return await getImagesPage({ search, cursor, limit: 50, columns: "list", snippet: 100 })
+  } catch (error) {
+    console.error("[Server] Error in getImageListPage action:", error)
+    throw new Error("Failed to fetch images")
+  }
+}
+
 // Server action to get a single image
 export async function fetchImageById(id: number) {
   try {
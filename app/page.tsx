@@ -1,4 +1,4 @@
-import { getImages } from "./actions"
+import { getImageListPage } from "./actions"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table"
 import Image from "next/image"
@@ -97,7 +97,7 @@ async function HomeContent({
   searchParams: { search?: string; id?: string }
 }) {
   console.log("[Server] HomeContent: Starting to fetch images")
-  const images = await getImages(searchParams.search)
+  const { images, nextCursor } = await getImageListPage(searchParams.search)
   console.log("[Server] HomeContent: Images fetched successfully")
   
   // Add detailed debugging
@@ -121,7 +121,7 @@ async function HomeContent({
             <CardTitle>Database Gambar</CardTitle>
           </CardHeader>
           <CardContent>
-            <ClientImageList initialImages={images} />
+            <ClientImageList initialImages={images} initialCursor={nextCursor} search={searchParams.search} />
           </CardContent>
         </Card>
       </div>
@@ -8,6 +8,7 @@ import { Search } from "lucide-react"
 import Link from "next/link"
 import { useRouter } from "next/navigation"
 import { useEffect, useState } from "react"
+import { getImageListPage } from "@/app/actions"
 
 // Format date consistently in YYYY-MM-DD format to avoid hydration issues
 const formatDate = (dateString: string) => {
@@ -24,8 +25,18 @@ const formatDate = (dateString: string) => {
   }
 };
 
-export default function ClientImageList({ initialImages }: { initialImages: any[] }) {
+export default function ClientImageList({
+  initialImages,
+  initialCursor = null,
+  search,
+}: {
+  initialImages: any[]
+  initialCursor?: string | null
+  search?: string
+}) {
   const [images, setImages] = useState<any[]>(initialImages);
+  const [nextCursor, setNextCursor] = useState<string | null>(initialCursor);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchTerm, setSearchTerm] = useState("");
   const [filteredImages, setFilteredImages] = useState<any[]>(initialImages);
   const router = useRouter();
@@ -33,35 +44,26 @@ export default function ClientImageList({ initialImages }: { initialImages: any[
   // Add debug logs
   console.log("[Client] ClientImageList rendered, initial images:", initialImages.length)
   
-  // Force client-side refresh of images on mount
+  // A new server render (refresh or search) starts again from its first page
   useEffect(() => {
-    const fetchImages = async () => {
-      try {
-        // First try direct Supabase endpoint
-        const response = await fetch('/api/supabase');
-        if (response.ok) {
-          const data = await response.json();
-          console.log("[Client] Fetched fresh images from direct Supabase:", Array.isArray(data) ? data.length : 'not array');
-          if (Array.isArray(data) && data.length > 0) {
-            setImages(data);
-            return;
-          }
-        }
-        
-        // Fallback to regular API
-        const fallbackResponse = await fetch('/api/images');
-        if (fallbackResponse.ok) {
-          const fallbackData = await fallbackResponse.json();
-          console.log("[Client] Fetched fallback images:", fallbackData.length);
-          setImages(fallbackData);
-        }
-      } catch (error) {
-        console.error("Error fetching images:", error);
-      }
-    };
-    
-    fetchImages();
-  }, []);
+    setImages(initialImages);
+    setNextCursor(initialCursor);
+  }, [initialImages, initialCursor]);
+  
+  // Append the next page of the list
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await getImageListPage(search, nextCursor);
+      setImages((current) => [...current, ...page.images]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error("Error fetching images:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
   
   // Filter images when searchTerm or images change
   useEffect(() => {
@@ -73,7 +75,7 @@ export default function ClientImageList({ initialImages }: { initialImages: any[
     const lowercaseSearch = searchTerm.toLowerCase();
     const filtered = images.filter(image => 
       (image.name && image.name.toLowerCase().includes(lowercaseSearch)) || 
-      (image.extracted_text && image.extracted_text.toLowerCase().includes(lowercaseSearch))
+      (image.snippet && image.snippet.toLowerCase().includes(lowercaseSearch))
     );
     
     setFilteredImages(filtered);
@@ -137,9 +139,9 @@ export default function ClientImageList({ initialImages }: { initialImages: any[
                   >
                     {image.image_path}
                   </TableCell>
-                  <TableCell className="max-w-[300px] truncate" title={image.extracted_text || "Tidak ada teks yang diekstrak"}>
-                    {image.extracted_text
-                      ? `${image.extracted_text.substring(0, 50)}${image.extracted_text.length > 50 ? "..." : ""}`
+                  <TableCell className="max-w-[300px] truncate" title={image.snippet || "Tidak ada teks yang diekstrak"}>
+                    {image.snippet
+                      ? `${image.snippet.substring(0, 50)}${image.snippet.length > 50 ? "..." : ""}`
                       : "Tidak ada teks yang diekstrak"}
                   </TableCell>
                   <TableCell>{formatDate(image.created_at)}</TableCell>
@@ -150,6 +152,14 @@ export default function ClientImageList({ initialImages }: { initialImages: any[
         </div>
       </div>
       
+      {nextCursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" size="sm" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? "Memuat..." : "Muat lebih banyak"}
+          </Button>
+        </div>
+      )}
+      
       {filteredImages.length === 0 && searchTerm && (
         <div className="text-center py-4 text-muted-foreground">
           Tidak ditemukan gambar yang cocok dengan "{searchTerm}"
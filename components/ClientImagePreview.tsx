@@ -44,52 +44,32 @@ export default function ClientImagePreview({ searchParams, images }: { searchPar
     setSelectedImage(newSelectedImage || null);
   }, [selectedId, imageData]);
   
-  // Fetch the image by ID directly if not found in the passed images array
+  // Fetch the full image when it isn't on the loaded page, or the page only has
+  // its list columns and a snippet of the extracted text
   useEffect(() => {
-    if (selectedId && (!selectedImage || selectedImage.id.toString() !== selectedId)) {
-      console.log("[Client] Fetching image by ID:", selectedId);
-      
-      const fetchImage = async () => {
-        try {
-          // First try to find it in the existing data
-          const existingImage = imageData.find((img: any) => img && img.id && img.id.toString() === selectedId);
-          if (existingImage) {
-            console.log("[Client] Found image in existing data:", selectedId);
-            setSelectedImage(existingImage);
-            return;
-          }
-          
-          // Try direct Supabase endpoint first
-          const directResponse = await fetch('/api/supabase');
-          if (directResponse.ok) {
-            const allImages = await directResponse.json();
-            if (Array.isArray(allImages)) {
-              const foundImage = allImages.find((img: any) => img.id.toString() === selectedId);
-              if (foundImage) {
-                console.log("[Client] Found image from direct Supabase:", selectedId);
-                setSelectedImage(foundImage);
-                return;
-              }
-            }
-          }
-          
-          // Fallback to regular API
-          const response = await fetch(`/api/images/${selectedId}`);
-          if (response.ok) {
-            const data = await response.json();
-            if (data) {
-              console.log("[Client] Fetched image data from API for ID:", selectedId);
-              setSelectedImage(data);
-            }
+    const id = selectedId ?? selectedImage?.id?.toString();
+    if (!id) return;
+    if (selectedImage && selectedImage.id.toString() === id && selectedImage.extracted_text !== undefined) return;
+    
+    console.log("[Client] Fetching image by ID:", id);
+    
+    const fetchImage = async () => {
+      try {
+        const response = await fetch(`/api/images/${id}`);
+        if (response.ok) {
+          const data = await response.json();
+          if (data) {
+            console.log("[Client] Fetched image data from API for ID:", id);
+            setSelectedImage(data);
           }
-        } catch (error) {
-          console.error("Error fetching image by ID:", error);
         }
-      };
-      
-      fetchImage();
-    }
-  }, [selectedId, selectedImage, imageData]);
+      } catch (error) {
+        console.error("Error fetching image by ID:", error);
+      }
+    };
+    
+    fetchImage();
+  }, [selectedId, selectedImage]);
   
   if (!selectedImage) {
     return (
@@ -1,14 +1,130 @@
 'use server'
 
-import { spawn } from "child_process"
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process"
 import path from "path"
 
+// Unwrap a parsed result from db_operations.py into its data or an error
+function interpretDbResult(parsedResult: any): { data?: any; error?: Error } {
+  if (parsedResult && parsedResult.success) {
+    if (parsedResult.data) {
+      // Return data field if it exists
+      return { data: parsedResult.data }
+    }
+    // Return the whole result if no data field
+    return { data: parsedResult }
+  } else if (parsedResult && parsedResult.error) {
+    return { error: new Error(parsedResult.error) }
+  }
+  return { error: new Error("Database operation failed: Unknown error") }
+}
+
+type PendingDbRequest = {
+  resolve: (data: any) => void
+  reject: (error: Error) => void
+  timer: NodeJS.Timeout
+}
+
+// Long-lived `db_operations.py --serve` process, so the interpreter start-up and
+// the Supabase TLS handshake are paid once instead of on every operation
+let dbServer: ChildProcessWithoutNullStreams | null = null
+let dbRequestCounter = 0
+const pendingDbRequests = new Map<string, PendingDbRequest>()
+const DB_REQUEST_TIMEOUT_MS = Number(process.env.DB_REQUEST_TIMEOUT_MS || 60000)
+
+// Reject every pending request and drop the server, so the next operation starts a new one
+function resetDbServer(server: ChildProcessWithoutNullStreams, error: Error) {
+  if (dbServer !== server) return
+  dbServer = null
+  for (const pending of pendingDbRequests.values()) {
+    clearTimeout(pending.timer)
+    pending.reject(error)
+  }
+  pendingDbRequests.clear()
+  server.kill()
+}
+
+function getDbServer(): ChildProcessWithoutNullStreams {
+  if (dbServer) return dbServer
+
+  const server = spawn("python", [path.join(process.cwd(), "python", "db_operations.py"), "--serve"])
+  let buffer = ""
+
+  server.stdout.on("data", (data) => {
+    buffer += data.toString()
+    let newlineIndex
+    while ((newlineIndex = buffer.indexOf("\n")) >= 0) {
+      const line = buffer.slice(0, newlineIndex).trim()
+      buffer = buffer.slice(newlineIndex + 1)
+      if (!line) continue
+
+      try {
+        const parsedResult = JSON.parse(line)
+        const pending = pendingDbRequests.get(parsedResult.request_id)
+        if (!pending) continue
+        pendingDbRequests.delete(parsedResult.request_id)
+        clearTimeout(pending.timer)
+        delete parsedResult.request_id
+
+        const { data, error } = interpretDbResult(parsedResult)
+        if (error) {
+          pending.reject(error)
+        } else {
+          pending.resolve(data)
+        }
+      } catch (parseError) {
+        console.error("Error parsing database result:", parseError)
+        console.error("Raw result:", line)
+      }
+    }
+  })
+
+  server.stderr.on("data", (data) => {
+    // Log stderr for debugging - this won't interfere with JSON parsing
+    console.log(`[Python stderr] ${data.toString().trim()}`)
+  })
+
+  server.on("close", (code) => {
+    console.error(`Database server exited with code ${code}`)
+    resetDbServer(server, new Error(`Database server exited with code ${code}`))
+  })
+
+  // A failed spawn, or a write after the process died, must not crash the app
+  server.on("error", (error) => {
+    console.error("Database server error:", error)
+    resetDbServer(server, error)
+  })
+  server.stdin.on("error", (error) => {
+    console.error("Database server stdin error:", error)
+    resetDbServer(server, error)
+  })
+
+  dbServer = server
+  return server
+}
+
 // Function to execute Python database operations
 // This is a server component and should not be imported in client components directly
 // Use server actions or API routes to access this functionality
 async function executePythonDbOperation(operation: string, params: any = {}): Promise<any> {
   console.log(`[DB] Executing operation: ${operation} with params:`, params)
-  
+
+  if (process.env.DB_ONE_SHOT === "true") {
+    return executePythonDbOperationOneShot(operation, params)
+  }
+
+  return new Promise((resolve, reject) => {
+    const requestId = String(++dbRequestCounter)
+    const timer = setTimeout(() => {
+      pendingDbRequests.delete(requestId)
+      reject(new Error(`Database operation ${operation} timed out after ${DB_REQUEST_TIMEOUT_MS} ms`))
+    }, DB_REQUEST_TIMEOUT_MS)
+    pendingDbRequests.set(requestId, { resolve, reject, timer })
+    getDbServer().stdin.write(JSON.stringify({ request_id: requestId, operation, ...params }) + "\n")
+  })
+}
+
+// Run a single operation in a fresh Python process
+async function executePythonDbOperationOneShot(operation: string, params: any = {}): Promise<any> {
   return new Promise((resolve, reject) => {
     const pythonProcess = spawn("python", [path.join(process.cwd(), "python", "db_operations.py")])
 
@@ -42,18 +158,11 @@ async function executePythonDbOperation(operation: string, params: any = {}): Pr
         const parsedResult = JSON.parse(result)
         console.log(`[Python result] Parsed result type:`, typeof parsedResult)
         
-        if (parsedResult && parsedResult.success) {
-          if (parsedResult.data) {
-            // Return data field if it exists
-            resolve(parsedResult.data)
-          } else {
-            // Return the whole result if no data field
-            resolve(parsedResult)
-          }
-        } else if (parsedResult && parsedResult.error) {
-          reject(new Error(parsedResult.error))
+        const { data, error } = interpretDbResult(parsedResult)
+        if (error) {
+          reject(error)
         } else {
-          reject(new Error("Database operation failed: Unknown error"))
+          resolve(data)
         }
       } catch (parseError) {
         console.error("Error parsing database result:", parseError)
@@ -122,6 +231,30 @@ export async function getImages(search?: string) {
   }
 }
 
+export type ImagesPageOptions = {
+  search?: string
+  limit: number
+  cursor?: string | null
+  columns?: string[] | "list"
+  snippet?: number
+  count?: "exact" | "planned" | "estimated"
+}
+
+// Get one page of images, newest first; pass nextCursor back as cursor for the next page
+export async function getImagesPage(options: ImagesPageOptions) {
+  try {
+    const result = await executePythonDbOperation("get_images", options)
+    return {
+      images: Array.isArray(result.images) ? result.images : [],
+      nextCursor: (result.next_cursor as string | null) ?? null,
+      count: result.count as number | undefined,
+    }
+  } catch (error) {
+    console.error("[DB] Error fetching images page:", error)
+    throw error
+  }
+}
+
 // Get a single image by ID
 export async function getImageById(id: number) {
   try {
@@ -175,4 +308,54 @@ export async function deleteImage(id: number) {
   }
 }
 
+type BulkResult = { success: boolean; id?: number; error?: string }
+
+// Add many images with a handful of bulk requests; returns one result per image
+export async function addImages(images: { name: string; imagePath: string; extractedText: string }[]) {
+  try {
+    const result = await executePythonDbOperation("add_images", {
+      images: images.map((image) => ({
+        name: image.name,
+        image_path: image.imagePath,
+        extracted_text: image.extractedText,
+      })),
+    })
+    return result.results as BulkResult[]
+  } catch (error) {
+    console.error("Error adding images:", error)
+    throw error
+  }
+}
+
+// Update many images with a handful of bulk requests; returns one result per image
+export async function updateImages(
+  images: { id: number; name: string; imagePath?: string; extractedText?: string }[],
+) {
+  try {
+    const result = await executePythonDbOperation("update_images", {
+      images: images.map((image) => ({
+        id: image.id,
+        name: image.name,
+        image_path: image.imagePath,
+        extracted_text: image.extractedText,
+      })),
+    })
+    return result.results as BulkResult[]
+  } catch (error) {
+    console.error("Error updating images:", error)
+    throw error
+  }
+}
+
+// Delete many images with a handful of bulk requests; returns one result per id
+export async function deleteImages(ids: number[]) {
+  try {
+    const result = await executePythonDbOperation("delete_images", { ids })
+    return result.results as BulkResult[]
+  } catch (error) {
+    console.error("Error deleting images:", error)
+    throw error
+  }
+}
+
 // No need for a pool export since we're using Python for connections
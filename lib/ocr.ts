@@ -2,7 +2,7 @@ import fs from "fs/promises"
 import path from "path"
 import { v4 as uuidv4 } from "uuid"
 import { optimizeImageForStorage, preprocessImageForOCR } from "./image-processing"
-import { spawn } from "child_process"
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process"
 
 export async function saveImage(base64Image: string, fileName: string): Promise<string> {
   try {
@@ -43,7 +43,121 @@ export async function saveImage(base64Image: string, fileName: string): Promise<
   }
 }
 
+type PendingOCRRequest = {
+  resolve: (text: string) => void
+  reject: (error: Error) => void
+  timer: NodeJS.Timeout
+}
+
+// Long-lived `ocr_service.py --serve` process shared by all OCR requests
+let ocrServer: ChildProcessWithoutNullStreams | null = null
+let ocrRequestCounter = 0
+const pendingOCRRequests = new Map<string, PendingOCRRequest>()
+const OCR_REQUEST_TIMEOUT_MS = Number(process.env.OCR_REQUEST_TIMEOUT_MS || 120000)
+
+// Reject every pending request and drop the server, so the next request starts a new one
+function resetOCRServer(server: ChildProcessWithoutNullStreams, error: Error) {
+  if (ocrServer !== server) return
+  ocrServer = null
+  for (const pending of pendingOCRRequests.values()) {
+    clearTimeout(pending.timer)
+    pending.reject(error)
+  }
+  pendingOCRRequests.clear()
+  server.kill()
+}
+
+function getOCRServer(): ChildProcessWithoutNullStreams {
+  if (ocrServer) return ocrServer
+
+  const server = spawn("python", [path.join(process.cwd(), "python", "ocr_service.py"), "--serve"])
+  let buffer = ""
+
+  server.stdout.on("data", (data) => {
+    buffer += data.toString()
+    let newlineIndex
+    while ((newlineIndex = buffer.indexOf("\n")) >= 0) {
+      const line = buffer.slice(0, newlineIndex).trim()
+      buffer = buffer.slice(newlineIndex + 1)
+      if (!line) continue
+
+      try {
+        const parsedResult = JSON.parse(line)
+        const pending = pendingOCRRequests.get(parsedResult.id)
+        if (!pending) continue
+        pendingOCRRequests.delete(parsedResult.id)
+        clearTimeout(pending.timer)
+
+        if (parsedResult.success) {
+          pending.resolve(parsedResult.text)
+        } else {
+          pending.reject(new Error(parsedResult.error || "OCR processing failed"))
+        }
+      } catch (parseError) {
+        console.error("Error parsing OCR result:", parseError)
+      }
+    }
+  })
+
+  server.stderr.on("data", (data) => {
+    console.error("[OCR server]", data.toString().trim())
+  })
+
+  server.on("close", (code) => {
+    console.error(`OCR server exited with code ${code}`)
+    resetOCRServer(server, new Error(`OCR server exited with code ${code}`))
+  })
+
+  // A failed spawn, or a write after the process died, must not crash the app
+  server.on("error", (error) => {
+    console.error("OCR server error:", error)
+    resetOCRServer(server, error)
+  })
+  server.stdin.on("error", (error) => {
+    console.error("OCR server stdin error:", error)
+    resetOCRServer(server, error)
+  })
+
+  ocrServer = server
+  return server
+}
+
+function sendOCRRequest(request: Record<string, unknown>, payload?: Buffer): Promise<string> {
+  return new Promise((resolve, reject) => {
+    const id = String(++ocrRequestCounter)
+    const timer = setTimeout(() => {
+      pendingOCRRequests.delete(id)
+      reject(new Error(`OCR request timed out after ${OCR_REQUEST_TIMEOUT_MS} ms`))
+    }, OCR_REQUEST_TIMEOUT_MS)
+    pendingOCRRequests.set(id, { resolve, reject, timer })
+
+    const server = getOCRServer()
+    if (payload) {
+      // Binary frame: JSON header with the payload length, then the raw bytes
+      server.stdin.write(JSON.stringify({ ...request, id, length: payload.length }) + "\n")
+      server.stdin.write(payload)
+    } else {
+      server.stdin.write(JSON.stringify({ ...request, id }) + "\n")
+    }
+  })
+}
+
 export async function processImageWithOCR(base64Image: string, language = "eng"): Promise<string> {
+  if (process.env.OCR_ONE_SHOT === "true") {
+    return processImageWithOCROneShot(base64Image, language)
+  }
+
+  // Decode here so the OCR service receives raw bytes instead of base64 JSON
+  const base64Data = base64Image.replace(/^data:[^,]*,/, "")
+  return sendOCRRequest({ language }, Buffer.from(base64Data, "base64"))
+}
+
+// OCR an image file that is already on disk without sending its contents
+export async function processImageFileWithOCR(imagePath: string, language = "eng"): Promise<string> {
+  return sendOCRRequest({ image_path: imagePath, language })
+}
+
+export async function processImageWithOCROneShot(base64Image: string, language = "eng"): Promise<string> {
   return new Promise((resolve, reject) => {
     const pythonProcess = spawn("python", [path.join(process.cwd(), "python", "ocr_service.py")])
 
@@ -68,17 +68,21 @@ def check_database_tables():
             for column in columns:
                 print(f"  - {column[0]}: {column[1]}")
             
-            # Check image records
+            # Check image records without loading the whole table or the extracted text
             print("\nChecking image records:")
-            cursor.execute("SELECT * FROM images ORDER BY created_at DESC")
-            images = cursor.fetchall()
+            cursor.execute("SELECT COUNT(*) FROM images")
+            total = cursor.fetchone()[0]
             
-            if not images:
+            if not total:
                 print("No images found in the database")
             else:
-                print(f"Found {len(images)} images:")
-                for image in images[:5]:  # Show first 5 images
-                    print(f"  - ID: {image[0]}, Name: {image[1]}, Path: {image[2]}, Created: {image[4]}")
+                print(f"Found {total} images:")
+                cursor.execute(
+                    "SELECT id, name, image_path, created_at FROM images "
+                    "ORDER BY created_at DESC, id DESC LIMIT 5"  # Show first 5 images
+                )
+                for image in cursor.fetchall():
+                    print(f"  - ID: {image[0]}, Name: {image[1]}, Path: {image[2]}, Created: {image[3]}")
         else:
             print("Images table not found in the database")
         
@@ -1,9 +1,20 @@
 import os
 import sys
 import json
+import argparse
+import base64
 import datetime
+import threading
+import time
+import sqlite3
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+from search_index import SearchIndex
+import metrics
+import jsonl_server
 
 # Load environment variables from .env.local
 load_dotenv('.env.local')
@@ -16,57 +27,493 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
     print("Error: Missing Supabase credentials in environment variables", file=sys.stderr)
     sys.exit(1)
 
-# Helper function for Supabase API requests
-def supabase_request(method, endpoint, data=None, params=None):
-    """Make a request to the Supabase API"""
-    url = f"{SUPABASE_URL}{endpoint}"
-    headers = {
+# HTTP settings: (connect, read) timeouts in seconds and retries for idempotent requests
+REQUEST_TIMEOUT = (float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', 5)),
+                   float(os.environ.get('SUPABASE_READ_TIMEOUT', 30)))
+REQUEST_RETRIES = int(os.environ.get('SUPABASE_RETRIES', 3))
+POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE', 10))
+
+# Maximum number of rows sent in one bulk request
+BULK_CHUNK_SIZE = int(os.environ.get('SUPABASE_BULK_CHUNK_SIZE', 200))
+
+# Full-text search backends: a ranked Postgres function (see sql/search_images.sql)
+# and/or a local SQLite FTS5 index kept up to date by this script
+SEARCH_RPC = os.environ.get('SUPABASE_SEARCH_RPC')
+SEARCH_INDEX_PATH = os.environ.get('OCR_SEARCH_INDEX')
+search_index = SearchIndex(SEARCH_INDEX_PATH) if SEARCH_INDEX_PATH else None
+
+# Prometheus metrics for serve mode, enabled with METRICS_ENABLED
+METRICS = metrics.Registry("db")
+METRICS.describe("requests_total", "Database operations handled, by operation and status")
+METRICS.describe("request_duration_seconds", "Time spent handling database operations, by operation")
+METRICS.describe("stage_duration_seconds", "Time spent in each stage of database operations")
+METRICS.describe("queue_wait_seconds", "Time operations waited for a free worker in serve mode")
+METRICS.describe("http_requests_total", "Supabase HTTP requests, by method and status")
+METRICS.describe("http_request_duration_seconds", "Supabase HTTP request latency, by method and endpoint")
+METRICS.describe("cache_requests_total", "Query cache lookups, by result")
+
+# Read-through cache for image lookups and listing/search pages
+CACHE_ENABLED = os.environ.get('DB_CACHE_DISABLED', '').lower() not in ('1', 'true', 'yes')
+CACHE_MAX_ENTRIES = int(os.environ.get('DB_CACHE_MAX_ENTRIES', 1000))
+CACHE_TTL = float(os.environ.get('DB_CACHE_TTL', 300))
+CACHE_PATH = os.environ.get('DB_CACHE_PATH')
+
+class QueryCache:
+    """
+    In-memory LRU cache with a TTL for query results, optionally backed by SQLite
+    
+    Single images are stored under "image:<id>" and listing/search pages under
+    "list:<arguments>", so writes can drop exactly the entries they affect.
+    Every invalidation also bumps a generation counter. Results fetched while
+    the generation changed are not stored, so a read that raced a write can't
+    cache stale data. Without a SQLite path, invalidate drops the exact
+    entries, so reads don't look at the generation. With a SQLite path,
+    entries and the generation are shared with other processes using the same
+    file: memory entries from an older generation are checked against SQLite,
+    where other processes deleted the entries they invalidated, before being
+    served.
+    """
+    
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, path=CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.local_generation = 0
+        self.connection = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self.connection:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                self.connection.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('generation', 0)")
+    
+    def _generation(self):
+        if self.connection:
+            return self.connection.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+        return self.local_generation
+    
+    def generation(self):
+        """Return the invalidation generation, to pass to set after fetching"""
+        with self.lock:
+            return self._generation()
+    
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self.lock:
+            generation = self._generation()
+            entry = self.entries.get(key)
+            # Only another process can invalidate behind our back, and only with SQLite
+            if entry and entry[0] > now and (not self.connection or entry[2] == generation):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+            if entry:
+                del self.entries[key]
+            
+            if self.connection:
+                row = self.connection.execute(
+                    "SELECT value, expires_at FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row:
+                    self._remember(key, row[1], row[0], generation)
+                    self.hits += 1
+                    return json.loads(row[0])
+            
+            self.misses += 1
+            return None
+    
+    def _remember(self, key, expires_at, value, generation):
+        self.entries[key] = (expires_at, value, generation)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def set(self, key, value, generation=None):
+        """
+        Cache a value for ttl seconds
+        
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+            generation: Result of generation() taken before the value was
+                fetched; the value is dropped if an invalidation happened since
+        
+        Returns:
+            bool: Whether the value was stored
+        """
+        expires_at = time.time() + self.ttl
+        payload = json.dumps(value)
+        with self.lock:
+            if not self.connection:
+                if generation is not None and generation != self.local_generation:
+                    return False
+                self._remember(key, expires_at, payload, self.local_generation)
+                return True
+            
+            # Check the generation and store in one write transaction, so an
+            # invalidation from another process can't slip in between
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._generation()
+                if generation is not None and generation != current:
+                    self.connection.rollback()
+                    return False
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, payload, expires_at)
+                )
+                self.connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            self._remember(key, expires_at, payload, current)
+            return True
+    
+    def invalidate(self, image_ids=()):
+        """Drop every listing page and the given images, and bump the generation"""
+        keys = [f"image:{id}" for id in image_ids]
+        with self.lock:
+            self.invalidations += 1
+            for key in list(self.entries):
+                if key.startswith("list:") or key in keys:
+                    del self.entries[key]
+            if self.connection:
+                with self.connection:
+                    self.connection.execute("DELETE FROM entries WHERE key LIKE 'list:%'")
+                    self.connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+                    self.connection.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            else:
+                self.local_generation += 1
+    
+    def stats(self):
+        """Return hit/miss counters and the number of cached entries"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "generation": self._generation(),
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl
+            }
+
+query_cache = QueryCache() if CACHE_ENABLED else None
+
+def _read_through(key, fetch):
+    """Return a cached result for key, or fetch it and cache it if it succeeded"""
+    if not query_cache:
+        return fetch()
+    with METRICS.stage("cache_lookup"):
+        cached = query_cache.get(key)
+    METRICS.inc("cache_requests_total", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return dict(cached, cached=True)
+    generation = query_cache.generation()
+    result = fetch()
+    if result["success"]:
+        query_cache.set(key, result, generation)
+    return result
+
+def _invalidate(image_ids=()):
+    """Drop cached listings, plus cached copies of the given images, after a write"""
+    if query_cache:
+        query_cache.invalidate([str(id) for id in image_ids])
+
+def create_session():
+    """Create a keep-alive session with a bounded connection pool and retries"""
+    retry = Retry(
+        total=REQUEST_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # POST is not idempotent, so a failed insert is never sent twice; a
+        # PATCH sets the same values again, so resending it is harmless
+        allowed_methods=frozenset(["GET", "PATCH", "DELETE"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
         "apikey": SUPABASE_ANON_KEY,
         "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
         "Content-Type": "application/json",
         "Prefer": "return=representation"
-    }
+    })
+    return session
+
+# Shared by every request of this process, so connections are reused
+session = create_session()
+
+# Helper function for Supabase API requests
+def _record_http(method, endpoint, status, seconds):
+    """Record the status and latency of one Supabase request"""
+    METRICS.inc("http_requests_total", method=method, status=status)
+    METRICS.observe("http_request_duration_seconds", seconds, method=method, endpoint=endpoint)
+    recorder = metrics.current()
+    if recorder is not None:
+        recorder.add_stage("http", seconds)
+        recorder.append("http", {"method": method, "endpoint": endpoint, "status": status,
+                                 "ms": round(seconds * 1000, 2)})
+
+def supabase_request(method, endpoint, data=None, params=None, headers=None):
+    """Make a request to the Supabase API; errors carry the HTTP "status" when a response arrived"""
+    url = f"{SUPABASE_URL}{endpoint}"
+    started = time.perf_counter()
+    status = "error"
     
     try:
         if method == "GET":
-            response = requests.get(url, headers=headers, params=params)
+            response = session.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         elif method == "POST":
-            response = requests.post(url, headers=headers, json=data)
-        elif method == "PUT":
-            response = requests.put(url, headers=headers, json=data)
+            response = session.post(url, json=data, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        elif method == "PATCH":
+            response = session.patch(url, json=data, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         elif method == "DELETE":
-            response = requests.delete(url, headers=headers, params=params)
+            response = session.delete(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         else:
             return {"success": False, "error": f"Unsupported method: {method}"}
         
+        status = response.status_code
         response.raise_for_status()
-        return {"success": True, "data": response.json()}
+        with METRICS.stage("parse"):
+            result = {"success": True, "data": response.json()}
+        
+        # With "Prefer: count=...", the total row count comes back in Content-Range
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        if total.isdigit():
+            result["count"] = int(total)
+        return result
     except requests.exceptions.RequestException as e:
-        return {"success": False, "error": str(e)}
+        result = {"success": False, "error": str(e)}
+        if status != "error":
+            result["status"] = status
+        return result
+    finally:
+        _record_http(method, endpoint, status, time.perf_counter() - started)
 
 def initialize_database():
     """Initialize the database - not needed with Supabase as we've created the table via migration"""
     return {"success": True, "message": "Database initialized successfully"}
 
-def get_images(search=None):
-    """Get all images with optional search filter"""
+# Columns shown by the image list, without the full extracted text
+LIST_COLUMNS = ["id", "name", "image_path", "created_at", "updated_at"]
+
+def encode_cursor(position):
+    """Encode a page position, a (created_at, id) keyset or a search offset, as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor made by encode_cursor"""
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+def _quote(value):
+    """Double-quote a value for a PostgREST filter, escaping backslashes and quotes"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _select_columns(columns, snippet, required=()):
+    """Build the select parameter for a column projection, given as a list or a comma-separated string"""
+    if columns == "list":
+        columns = LIST_COLUMNS
+    if isinstance(columns, str):
+        columns = columns.split(",")
+    columns = [column.strip() for column in columns or () if column.strip()]
+    if not columns:
+        return "*"
+    for column in required:
+        if column not in columns:
+            columns.append(column)
+    if snippet and "extracted_text" not in columns:
+        columns.append("extracted_text")
+    return ",".join(columns)
+
+def _apply_snippet(rows, snippet):
+    """Replace extracted_text with its first snippet characters"""
+    if not snippet:
+        return
+    for row in rows:
+        text = row.pop("extracted_text", None) or ""
+        row["snippet"] = text[:int(snippet)] + ("..." if len(text) > int(snippet) else "")
+
+def get_images(search=None, limit=None, cursor=None, columns=None, snippet=None, count=None):
+    """
+    Get images, newest first, with optional search filter, through the query cache
+    
+    Without a limit every matching row is returned in "data", as before. With
+    a limit, "data" holds one page: {"images", "next_cursor", "count"}. Pass
+    next_cursor back as cursor to get the following page. Pages are read with
+    a keyset on (created_at, id), so deep pages cost the same as the first.
+    
+    Args:
+        search: Case-insensitive text matched against name and extracted_text
+        limit: Page size
+        cursor: next_cursor of the previous page
+        columns: List of columns to return, or "list" for LIST_COLUMNS (default: all)
+        snippet: Return the first snippet characters of extracted_text as
+            "snippet" instead of the full text
+        count: "exact", "planned" or "estimated" to include the total number of
+            matches; requires a limit, since only pages have room for it
+    """
+    if count and not limit:
+        return {"success": False, "error": "count requires a limit"}
+    key = "list:" + json.dumps([search, limit, cursor, columns, snippet, count])
+    return _read_through(key, lambda: _query_images(search, limit, cursor, columns, snippet, count))
+
+def _query_images(search=None, limit=None, cursor=None, columns=None, snippet=None, count=None):
+    """Query images for get_images, bypassing the cache"""
     endpoint = "/rest/v1/images"
-    params = {"select": "*", "order": "created_at.desc"}
     
+    if search and (SEARCH_RPC or search_index):
+        return search_images(search, limit, cursor, columns, snippet, count)
+    
+    params = {
+        # Keyset pagination needs both cursor columns
+        "select": _select_columns(columns, snippet, ("id", "created_at") if limit else ()),
+        "order": "created_at.desc,id.desc"
+    }
+    
+    filters = []
     if search:
         # PostgreSQL ILIKE for case-insensitive search
-        params["or"] = f"name.ilike.*{search}*,extracted_text.ilike.*{search}*"
+        pattern = _quote(f"*{search}*")
+        filters.append(f'or(name.ilike.{pattern},extracted_text.ilike.{pattern})')
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        created_at = _quote(created_at)
+        filters.append(f'or(created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{int(id)}))')
+    if len(filters) == 1:
+        params["or"] = filters[0][2:]
+    elif filters:
+        params["and"] = "(" + ",".join(filters) + ")"
     
-    result = supabase_request("GET", endpoint, params=params)
+    if limit:
+        # Fetch one extra row to know whether there is a next page
+        params["limit"] = int(limit) + 1
+    
+    headers = {"Prefer": f"count={count}"} if count in ("exact", "planned", "estimated") else None
+    result = supabase_request("GET", endpoint, params=params, headers=headers)
+    if not result["success"]:
+        return result
+    
+    rows = result["data"]
+    next_cursor = None
+    if limit and len(rows) > int(limit):
+        rows = rows[:int(limit)]
+        next_cursor = encode_cursor([rows[-1]["created_at"], rows[-1]["id"]])
+    
+    _apply_snippet(rows, snippet)
     
     # Add a debug log to stderr - this won't interfere with the JSON output
-    if result["success"]:
-        print(f"DEBUG: Returning {len(result['data'])} images", file=sys.stderr)
+    print(f"DEBUG: Returning {len(rows)} images", file=sys.stderr)
     
-    return result
+    if not limit:
+        return {"success": True, "data": rows}
+    
+    page = {"images": rows, "next_cursor": next_cursor}
+    if "count" in result:
+        page["count"] = result["count"]
+    return {"success": True, "data": page}
+
+def search_images(search, limit=None, cursor=None, columns=None, snippet=None, count=None):
+    """
+    Ranked full-text search over image names and extracted text
+    
+    Uses the SUPABASE_SEARCH_RPC Postgres function (and its "_count"
+    companion when count is requested) when configured, otherwise the local
+    OCR_SEARCH_INDEX. Every word must match the start of a word in
+    the document; results are ordered by relevance. Takes and returns the
+    same options and shapes as get_images, with offset-based cursors.
+    """
+    offset = decode_cursor(cursor)["offset"] if cursor else 0
+    fetch = int(limit) + 1 if limit else None
+    select = _select_columns(columns, snippet, ("id",))
+    total = None
+    
+    if SEARCH_RPC:
+        result = supabase_request(
+            "POST", f"/rest/v1/rpc/{SEARCH_RPC}",
+            data={"query": search, "max_rows": fetch, "skip": offset},
+            params={"select": select}
+        )
+        if not result["success"]:
+            return result
+        rows = result["data"]
+        if count:
+            # The function pages its results, so the total comes from its companion
+            counted = supabase_request("POST", f"/rest/v1/rpc/{SEARCH_RPC}_count", data={"query": search})
+            if not counted["success"]:
+                return counted
+            total = counted["data"]
+    else:
+        hits = search_index.search(search, fetch, offset, count=bool(count))
+        total = hits.get("count")
+        found = {}
+        for ids in _chunks(hits["ids"]):
+            result = supabase_request("GET", "/rest/v1/images", params={"select": select, "id": _format_in(ids)})
+            if not result["success"]:
+                return result
+            found.update((row["id"], row) for row in result["data"])
+        # Keep the index's rank order and skip ids deleted behind the index's back
+        rows = []
+        for id, rank in zip(hits["ids"], hits["ranks"]):
+            if id in found:
+                rows.append(dict(found[id], rank=round(-rank, 4)))
+    
+    next_cursor = None
+    if limit and len(rows) > int(limit):
+        rows = rows[:int(limit)]
+        next_cursor = encode_cursor({"offset": offset + int(limit)})
+    
+    _apply_snippet(rows, snippet)
+    
+    print(f"DEBUG: Returning {len(rows)} search results", file=sys.stderr)
+    
+    if not limit:
+        return {"success": True, "data": rows}
+    
+    page = {"images": rows, "next_cursor": next_cursor}
+    if total is not None:
+        page["count"] = total
+    return {"success": True, "data": page}
+
+def reindex_search():
+    """Rebuild the local search index from every image in Supabase"""
+    if not search_index:
+        return {"success": False, "error": "OCR_SEARCH_INDEX is not configured"}
+    
+    search_index.clear()
+    indexed = 0
+    cursor = None
+    while True:
+        result = _query_images(limit=500, cursor=cursor, columns=["id", "name", "extracted_text"])
+        if not result["success"]:
+            return result
+        page = result["data"]
+        search_index.add_many((row["id"], row["name"], row["extracted_text"]) for row in page["images"])
+        indexed += len(page["images"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return {"success": True, "indexed": indexed}
 
 def get_image_by_id(id):
-    """Get a single image by ID"""
+    """Get a single image by ID, through the query cache"""
+    return _read_through(f"image:{id}", lambda: _query_image_by_id(id))
+
+def _query_image_by_id(id):
+    """Query a single image for get_image_by_id, bypassing the cache"""
     endpoint = f"/rest/v1/images"
     params = {"id": f"eq.{id}", "select": "*"}
     
@@ -91,6 +538,9 @@ def add_image(name, image_path, extracted_text):
     result = supabase_request("POST", endpoint, data=data)
     
     if result["success"] and result["data"] and len(result["data"]) > 0:
+        _invalidate()
+        if search_index:
+            search_index.add(result["data"][0]["id"], name, extracted_text)
         return {"success": True, "id": result["data"][0]["id"]}
     return result
 
@@ -111,11 +561,15 @@ def update_image(id, name, image_path=None, extracted_text=None):
     # Add the updated_at timestamp
     data["updated_at"] = datetime.datetime.utcnow().isoformat()
     
-    result = supabase_request("PUT", endpoint, data=data, params=params)
+    # PATCH updates the matching row; PUT would be an upsert needing every column
+    result = supabase_request("PATCH", endpoint, data=data, params=params)
+    _invalidate([id])
     
     if result["success"]:
         if not result["data"] or len(result["data"]) == 0:
             return {"success": False, "error": "Image not found"}
+        if search_index:
+            search_index.update(id, name, extracted_text)
         return {"success": True}
     return result
 
@@ -125,49 +579,275 @@ def delete_image(id):
     params = {"id": f"eq.{id}"}
     
     result = supabase_request("DELETE", endpoint, params=params)
+    _invalidate([id])
     
     if result["success"]:
+        if search_index:
+            search_index.delete(id)
         return {"success": True}
     return result
 
+def _chunks(items, size=None):
+    """Split a list into chunks of at most size items"""
+    size = size or BULK_CHUNK_SIZE
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def _format_in(values):
+    """Format values for a PostgREST in.(...) filter, quoting each one"""
+    return "in.(" + ",".join(_quote(value) for value in values) + ")"
+
+def _image_id(value):
+    """Return an image id as a string, or None if it isn't a non-negative integer"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return str(value) if value >= 0 else None
+    if isinstance(value, str) and value.strip().isdigit():
+        return str(int(value))
+    return None
+
+def add_images(images):
+    """
+    Add many images with one request per chunk
+    
+    Args:
+        images: List of {"name", "image_path", "extracted_text"}
+    
+    Returns:
+        dict: One {"success", "id"} or {"success", "error"} per input row, in order
+    """
+    endpoint = "/rest/v1/images"
+    results = []
+    
+    for chunk in _chunks(images or []):
+        data = [{
+            "name": image.get("name"),
+            "image_path": image.get("image_path"),
+            "extracted_text": image.get("extracted_text")
+        } for image in chunk]
+        
+        result = supabase_request("POST", endpoint, data=data)
+        if result["success"] and len(result["data"]) == len(data):
+            # PostgREST returns inserted rows in the order they were sent
+            results.extend({"success": True, "id": row["id"]} for row in result["data"])
+            _invalidate()
+            if search_index:
+                search_index.add_many((row["id"], row["name"], row["extracted_text"]) for row in result["data"])
+            continue
+        
+        if result["success"]:
+            # Some rows may have been inserted, so resending any of them could duplicate them
+            _invalidate()
+            error = f"Expected {len(data)} inserted rows, got {len(result['data'])}"
+            results.extend({"success": False, "error": error} for _ in chunk)
+        elif result.get("status") in (400, 409, 422):
+            # PostgREST rejected the whole chunk without inserting anything,
+            # so insert its rows one by one to find the bad ones
+            for image in chunk:
+                results.append(add_image(image.get("name"), image.get("image_path"), image.get("extracted_text")))
+        else:
+            # A timeout or server error may come after the insert was committed,
+            # and POST is never retried, so report the chunk as failed
+            results.extend({"success": False, "error": result["error"]} for _ in chunk)
+    
+    return {"success": True, "results": results}
+
+def update_images(images):
+    """
+    Update many images with one upsert request per chunk
+    
+    Only columns present in a row are changed. Rows whose id doesn't exist are
+    reported as not found instead of being inserted.
+    
+    Args:
+        images: List of {"id", "name", "image_path", "extracted_text"}
+    
+    Returns:
+        dict: One {"success"} or {"success", "error"} per input row, in order
+    """
+    endpoint = "/rest/v1/images"
+    updated_at = datetime.datetime.utcnow().isoformat()
+    results = []
+    
+    for chunk in _chunks(images or []):
+        chunk_results = [None] * len(chunk)
+        ids = [_image_id(image.get("id")) for image in chunk]
+        
+        existing_ids = set()
+        if any(id is not None for id in ids):
+            existing = supabase_request("GET", endpoint, params={
+                "select": "id",
+                "id": _format_in(id for id in ids if id is not None)
+            })
+            if not existing["success"]:
+                results.extend({"success": False, "error": existing["error"]} for _ in chunk)
+                continue
+            existing_ids = {str(row["id"]) for row in existing["data"]}
+        
+        # PostgREST needs every object of a bulk request to have the same keys
+        groups = {}
+        for index, (id, image) in enumerate(zip(ids, chunk)):
+            if id not in existing_ids:
+                chunk_results[index] = {"success": False, "error": "Image not found"}
+                continue
+            data = {key: image[key] for key in ("name", "image_path", "extracted_text") if key in image}
+            data.update(id=int(id), updated_at=updated_at)
+            groups.setdefault(tuple(sorted(data)), []).append((index, data))
+        
+        for rows in groups.values():
+            result = supabase_request(
+                "POST", endpoint,
+                data=[data for _, data in rows],
+                params={"on_conflict": "id"},
+                headers={"Prefer": "resolution=merge-duplicates,return=representation"}
+            )
+            _invalidate([data["id"] for _, data in rows])
+            for index, _ in rows:
+                chunk_results[index] = {"success": True} if result["success"] else {"success": False, "error": result["error"]}
+            if result["success"] and search_index:
+                for _, data in rows:
+                    search_index.update(data["id"], data.get("name"), data.get("extracted_text"))
+        
+        results.extend(chunk_results)
+    
+    return {"success": True, "results": results}
+
+def delete_images(ids):
+    """
+    Delete many images with one request per chunk
+    
+    Args:
+        ids: List of image ids
+    
+    Returns:
+        dict: One {"success"} or {"success", "error"} per input id, in order
+    """
+    endpoint = "/rest/v1/images"
+    results = []
+    
+    for chunk in _chunks(ids or []):
+        chunk = [_image_id(id) for id in chunk]
+        valid = [id for id in chunk if id is not None]
+        if not valid:
+            results.extend({"success": False, "error": "Image not found"} for _ in chunk)
+            continue
+        result = supabase_request("DELETE", endpoint, params={"id": _format_in(valid), "select": "id"})
+        _invalidate(valid)
+        if not result["success"]:
+            results.extend({"success": False, "error": result["error"]} for _ in chunk)
+            continue
+        deleted = {str(row["id"]) for row in result["data"]}
+        if search_index:
+            search_index.delete_many(row["id"] for row in result["data"])
+        results.extend({"success": True} if id in deleted else {"success": False, "error": "Image not found"}
+                       for id in chunk)
+    
+    return {"success": True, "results": results}
+
+def handle_request(data):
+    """
+    Dispatch a parsed request to the matching database operation
+    
+    With "metrics": true the result includes per-stage timings and every
+    Supabase call made, and "operation": "metrics" returns the Prometheus
+    metrics collected when METRICS_ENABLED is set.
+    """
+    operation = data.get("operation")
+    with metrics.request(bool(data.get("metrics"))) as recorder:
+        started = time.perf_counter()
+        result = _route_request(data)
+        METRICS.inc("requests_total", operation=operation, status="success" if result.get("success") else "error")
+        METRICS.observe("request_duration_seconds", time.perf_counter() - started, operation=operation)
+        if recorder:
+            result = dict(result, metrics=recorder.summary())
+    return result
+
+def _route_request(data):
+    """Dispatch a request for handle_request"""
+    operation = data.get("operation")
+    
+    print(f"DEBUG: Processing operation '{operation}'", file=sys.stderr)
+    
+    if operation == "initialize":
+        return initialize_database()
+    elif operation == "get_images":
+        return get_images(
+            data.get("search"),
+            limit=data.get("limit"),
+            cursor=data.get("cursor"),
+            columns=data.get("columns"),
+            snippet=data.get("snippet"),
+            count=data.get("count")
+        )
+    elif operation == "get_image_by_id":
+        id = data.get("id")
+        return get_image_by_id(id)
+    elif operation == "add_image":
+        name = data.get("name")
+        image_path = data.get("image_path")
+        extracted_text = data.get("extracted_text")
+        return add_image(name, image_path, extracted_text)
+    elif operation == "update_image":
+        id = data.get("id")
+        name = data.get("name")
+        image_path = data.get("image_path")
+        extracted_text = data.get("extracted_text")
+        return update_image(id, name, image_path, extracted_text)
+    elif operation == "delete_image":
+        id = data.get("id")
+        return delete_image(id)
+    elif operation == "metrics":
+        if not METRICS.enabled:
+            return {"success": False, "error": "Metrics are disabled, set METRICS_ENABLED=true"}
+        return {"success": True, "data": METRICS.render()}
+    elif operation == "cache_stats":
+        if not query_cache:
+            return {"success": False, "error": "Query cache is disabled"}
+        return {"success": True, "data": query_cache.stats()}
+    elif operation == "reindex_search":
+        return reindex_search()
+    elif operation == "add_images":
+        return add_images(data.get("images"))
+    elif operation == "update_images":
+        return update_images(data.get("images"))
+    elif operation == "delete_images":
+        return delete_images(data.get("ids"))
+    else:
+        return {"success": False, "error": f"Unknown operation: {operation}"}
+
+def serve(workers=None):
+    """
+    Serve database operations as newline-delimited JSON over stdin/stdout
+    
+    Each input line is a request object with an optional "request_id" which
+    is echoed back on the matching response line ("id" already names the
+    image in several operations). All requests share one pooled
+    keep-alive session, so only the first request pays for the TCP and TLS
+    handshake.
+    """
+    jsonl_server.serve(lambda data, emit, payload: handle_request(data),
+                       workers=workers or POOL_SIZE, registry=METRICS)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Supabase database operations")
+    parser.add_argument("--serve", action="store_true", help="Serve newline-delimited JSON requests until stdin closes")
+    parser.add_argument("--workers", type=int, default=None, help="Number of concurrent operations in serve mode")
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve(args.workers)
+        sys.exit(0)
+    
     # Read input from stdin
     input_data = sys.stdin.read()
     
     try:
         # Parse the JSON input
         data = json.loads(input_data)
-        operation = data.get("operation")
-        
-        print(f"DEBUG: Processing operation '{operation}'", file=sys.stderr)
-        
-        if operation == "initialize":
-            result = initialize_database()
-        elif operation == "get_images":
-            search = data.get("search")
-            result = get_images(search)
-        elif operation == "get_image_by_id":
-            id = data.get("id")
-            result = get_image_by_id(id)
-        elif operation == "add_image":
-            name = data.get("name")
-            image_path = data.get("image_path")
-            extracted_text = data.get("extracted_text")
-            result = add_image(name, image_path, extracted_text)
-        elif operation == "update_image":
-            id = data.get("id")
-            name = data.get("name")
-            image_path = data.get("image_path")
-            extracted_text = data.get("extracted_text")
-            result = update_image(id, name, image_path, extracted_text)
-        elif operation == "delete_image":
-            id = data.get("id")
-            result = delete_image(id)
-        else:
-            result = {"success": False, "error": f"Unknown operation: {operation}"}
+        result = handle_request(data)
         
         # Print the result as JSON
         print(json.dumps(result))
-        
+    
     except Exception as e:
-        print(json.dumps({"success": False, "error": str(e)})) 
\ No newline at end of file
+        print(json.dumps({"success": False, "error": str(e)}))
\ No newline at end of file
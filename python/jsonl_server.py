@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+def read_frame(stream, length):
+    """
+    Read exactly length bytes of a binary frame, or None if the stream ends first
+    
+    Raises:
+        ValueError: If length is not a non-negative integer; nothing is read then
+    """
+    if isinstance(length, bool) or not isinstance(length, int) or length < 0:
+        raise ValueError(f"Invalid frame length {length!r}, expected a non-negative integer")
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return payload
+
+def serve(handle, id_field="request_id", workers=None, registry=None, frames=False, detached=None):
+    """
+    Serve requests as newline-delimited JSON over stdin/stdout
+    
+    Each input line is a request object with an optional id_field which is
+    echoed back on the matching response line. Requests are answered by a
+    warm pool of worker threads, so responses may arrive out of order.
+    Threads are enough for every service here because the heavy lifting
+    happens in tesseract subprocesses, worker processes or HTTP calls.
+    
+    Args:
+        handle: Called as handle(data, emit, payload) and returns the response;
+            emit writes a partial response for the same request
+        id_field: Request field echoed back on its responses
+        workers: Number of worker threads (default: CPU count)
+        registry: Optional metrics.Registry that records serialization time
+            and the time requests wait for a free worker
+        frames: Whether a request with a "length" field is followed by exactly
+            that many bytes of raw data, passed to handle as payload
+        detached: Optional predicate for requests that may block for a long
+            time, which get their own thread instead of a pool worker
+    """
+    write_lock = threading.Lock()
+    
+    def respond(request_id, result):
+        if request_id is not None:
+            result = dict(result, **{id_field: request_id})
+        started = time.perf_counter()
+        line = json.dumps(result)
+        if registry:
+            registry.observe("stage_duration_seconds", time.perf_counter() - started, stage="serialize")
+        with write_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+    
+    def run(request_id, data, payload, received):
+        with metrics.request(bool(data.get("metrics"))) as recorder:
+            waited = time.perf_counter() - received
+            if registry:
+                registry.observe("queue_wait_seconds", waited)
+            if recorder:
+                recorder.started = received
+                recorder.add_stage("queue_wait", waited)
+            try:
+                result = handle(data, lambda partial: respond(request_id, partial), payload)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+        respond(request_id, result)
+    
+    stdin = sys.stdin.buffer
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for line in iter(stdin.readline, b""):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except Exception as e:
+                respond(None, {"success": False, "error": f"Invalid request: {e}"})
+                continue
+            if not isinstance(data, dict):
+                respond(None, {"success": False, "error": "Invalid request: expected a JSON object"})
+                continue
+            
+            payload = None
+            if frames and data.get("length") is not None:
+                try:
+                    payload = read_frame(stdin, data["length"])
+                except ValueError as e:
+                    respond(data.get(id_field), {"success": False, "error": str(e)})
+                    continue
+                if payload is None:
+                    respond(data.get(id_field), {"success": False, "error": "Truncated image frame"})
+                    break
+            
+            args = (data.get(id_field), data, payload, time.perf_counter())
+            if detached and detached(data):
+                threading.Thread(target=run, args=args, daemon=True).start()
+            else:
+                pool.submit(run, *args)
@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# Collecting Prometheus metrics is opt-in; per-request timings are returned
+# whenever a request sets "metrics": true, regardless of this flag
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# Histogram buckets in seconds, from a fast cache hit to a large OCR page
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_local = threading.local()
+
+class Recorder:
+    """
+    Timings and details of one request
+    
+    Stage durations with the same name are summed, so a stage that runs once
+    per page or per HTTP call reports its total.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.fields = {}
+    
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+    
+    def record(self, **fields):
+        self.fields.update(fields)
+    
+    def append(self, name, value):
+        self.fields.setdefault(name, []).append(value)
+    
+    def summary(self):
+        """Return the timings in milliseconds plus the recorded fields"""
+        result = {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+        }
+        result.update(self.fields)
+        return result
+
+def current():
+    """Return the recorder of the request running on this thread, if any"""
+    return getattr(_local, "recorder", None)
+
+@contextmanager
+def request(active=True):
+    """
+    Record the request running on this thread
+    
+    Nested calls share the outer recorder, so a server loop can record the
+    queue wait before handing the request to handle_request.
+    
+    Args:
+        active: Whether to record at all; when False, yields None unless an
+            outer call is already recording
+    """
+    recorder = current()
+    if recorder is not None or not active:
+        yield recorder
+        return
+    _local.recorder = recorder = Recorder()
+    try:
+        yield recorder
+    finally:
+        _local.recorder = None
+
+def record(**fields):
+    """Add fields, such as image dimensions, to the current request"""
+    recorder = current()
+    if recorder is not None:
+        recorder.record(**fields)
+
+def _format_labels(labels):
+    return ",".join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in labels)
+
+class Registry:
+    """
+    Thread-safe Prometheus counters and histograms for one service
+    
+    Metric names are prefixed with the namespace. When disabled, inc and
+    observe return immediately and stage only times requests that asked for
+    their metrics.
+    """
+    
+    def __init__(self, namespace, enabled=METRICS_ENABLED, buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.help = {}
+        self.counters = {}
+        self.histograms = {}
+    
+    def describe(self, name, text):
+        """Set the HELP text of a metric"""
+        self.help[name] = text
+    
+    def inc(self, name, value=1, **labels):
+        """Increase a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, seconds, **labels):
+        """Add a duration in seconds to a histogram"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+    
+    @contextmanager
+    def stage(self, name):
+        """Time a block as a named stage of the current request and in the stage histogram"""
+        recorder = current()
+        if recorder is None and not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            if recorder is not None:
+                recorder.add_stage(name, seconds)
+            self.observe("stage_duration_seconds", seconds, stage=name)
+    
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+        
+        described = set()
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                full_name = f"{self.namespace}_{name}"
+                if name in self.help:
+                    lines.append(f"# HELP {full_name} {self.help[name]}")
+                lines.append(f"# TYPE {full_name} {kind}")
+        
+        for (name, labels), value in counters:
+            header(name, "counter")
+            label_text = _format_labels(labels)
+            lines.append(f"{self.namespace}_{name}{{{label_text}}} {value}" if label_text
+                         else f"{self.namespace}_{name} {value}")
+        
+        for (name, labels), (counts, total, count) in histograms:
+            header(name, "histogram")
+            full_name = f"{self.namespace}_{name}"
+            prefix = _format_labels(labels)
+            prefix = prefix + "," if prefix else ""
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{full_name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{full_name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = "{" + prefix.rstrip(",") + "}" if prefix else ""
+            lines.append(f"{full_name}_sum{suffix} {total}")
+            lines.append(f"{full_name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
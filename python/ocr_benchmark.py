@@ -0,0 +1,534 @@
+import os
+import io
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+
+# Every page must reach tesseract; the OCR result cache would turn repeat runs into lookups
+os.environ['OCR_CACHE_DISABLED'] = '1'
+
+import pytesseract
+import ocr_service
+
+SERVICE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_service.py')
+
+# Synthetic corpus dimensions; every combination is rendered once per language
+LANGUAGES = ("eng", "ind")
+DPIS = (150, 300)
+PAGE_SIZES = {"a6": (4.13, 5.83), "a5": (5.83, 8.27), "a4": (8.27, 11.69)}
+ROTATIONS = (0, 3)
+NOISE_LEVELS = (0.0, 0.03)
+FONT_POINTS = 11
+MAX_LINES = 20
+
+FONT_PATHS = (
+    os.environ.get('BENCHMARK_FONT', ''),
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial.ttf',
+    'C:\\Windows\\Fonts\\arial.ttf',
+)
+
+SENTENCES = {
+    "eng": [
+        "The invoice was sent to the customer at the end of the month.",
+        "Please keep this receipt as proof of payment for your records.",
+        "All items in the order have been checked and packed with care.",
+        "The meeting will start at nine in the morning in the main hall.",
+        "Our office is closed on public holidays and during the weekend.",
+        "This document contains the results of the annual quality review.",
+        "The total amount includes tax and the cost of shipping.",
+        "For further information, contact the support team by email.",
+        "The report shows that sales grew steadily over the last quarter.",
+        "Each page of the form must be signed and dated by the applicant.",
+    ],
+    "ind": [
+        "Faktur ini telah dikirim kepada pelanggan pada akhir bulan.",
+        "Harap simpan kwitansi ini sebagai bukti pembayaran yang sah.",
+        "Semua barang dalam pesanan sudah diperiksa dan dikemas dengan baik.",
+        "Rapat akan dimulai pada pukul sembilan pagi di ruang utama.",
+        "Kantor kami tutup pada hari libur nasional dan akhir pekan.",
+        "Dokumen ini berisi hasil tinjauan mutu tahunan perusahaan.",
+        "Jumlah total sudah termasuk pajak dan biaya pengiriman barang.",
+        "Untuk informasi lebih lanjut, silakan hubungi tim dukungan kami.",
+        "Laporan tersebut menunjukkan bahwa penjualan naik setiap bulan.",
+        "Setiap halaman formulir harus ditandatangani oleh pemohon.",
+    ],
+}
+
+# Scenarios compare one-shot and persistent mode, worker counts, tesseract
+# settings, preprocessing and language detection on the same corpus
+SCENARIOS = [
+    {"name": "oneshot", "mode": "oneshot", "workers": 1},
+    {"name": "serve-w1", "mode": "serve", "workers": 1},
+    {"name": "serve-w2", "mode": "serve", "workers": 2},
+    {"name": "serve-w4", "mode": "serve", "workers": 4},
+    {"name": "oem1-psm3", "mode": "inprocess", "workers": 1, "config": "--oem 1 --psm 3"},
+    {"name": "oem1-psm4", "mode": "inprocess", "workers": 1, "config": "--oem 1 --psm 4"},
+    {"name": "oem1-psm6", "mode": "inprocess", "workers": 1, "config": "--oem 1 --psm 6"},
+    {"name": "oem3-psm3", "mode": "inprocess", "workers": 1, "config": "--oem 3 --psm 3"},
+    {"name": "preprocess-default", "mode": "serve", "workers": 1, "preprocess": True},
+    {"name": "preprocess-binarize", "mode": "serve", "workers": 1, "preprocess": ["grayscale", "binarize"]},
+    {"name": "preprocess-deskew", "mode": "serve", "workers": 1, "preprocess": ["grayscale", "deskew"]},
+    {"name": "language-known", "mode": "serve", "workers": 1, "language": "page"},
+    {"name": "language-detect", "mode": "serve", "workers": 1, "detect_language": True},
+]
+
+# Allowed change before a metric counts as a regression
+DEFAULT_TOLERANCE = 0.15
+CER_TOLERANCE = 0.02
+
+def _load_font(size):
+    """Load a TrueType font at size pixels, falling back to Pillow's built-in font"""
+    for path in FONT_PATHS:
+        if path and os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow before 10.1 only has the small fixed-size bitmap font
+        return ImageFont.load_default()
+
+def _wrap_text(words, font, width, max_lines):
+    """Greedily wrap words into at most max_lines lines no wider than width"""
+    lines = []
+    line = ""
+    for word in words:
+        candidate = f"{line} {word}" if line else word
+        if line and font.getlength(candidate) > width:
+            lines.append(line)
+            if len(lines) == max_lines:
+                return lines
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines[:max_lines]
+
+def _add_noise(image, level, rng):
+    """Flip a share of pixels to black or white (salt and pepper noise)"""
+    if not level:
+        return image
+    pixels = image.load()
+    for _ in range(int(image.width * image.height * level)):
+        pixels[rng.randrange(image.width), rng.randrange(image.height)] = rng.choice((0, 255))
+    return image
+
+def render_page(language, dpi, page_size, rotation, noise, seed):
+    """
+    Render one synthetic page
+    
+    Args:
+        language: "eng" or "ind", selects the sentence pool
+        dpi: Resolution; sets the pixel size of the page and the font
+        page_size: Key of PAGE_SIZES
+        rotation: Skew in degrees
+        noise: Share of pixels replaced by salt and pepper noise
+        seed: Random seed, so the same arguments always give the same page
+    
+    Returns:
+        tuple: (PNG bytes, ground truth text)
+    """
+    rng = random.Random(seed)
+    width_inches, height_inches = PAGE_SIZES[page_size]
+    width, height = int(width_inches * dpi), int(height_inches * dpi)
+    margin = dpi // 2
+    font = _load_font(int(FONT_POINTS * dpi / 72))
+    line_height = int(FONT_POINTS * dpi / 72 * 1.5)
+    max_lines = min(MAX_LINES, (height - 2 * margin) // line_height)
+    
+    words = " ".join(rng.choice(SENTENCES[language]) for _ in range(max_lines * 2)).split()
+    lines = _wrap_text(words, font, width - 2 * margin, max_lines)
+    
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for number, line in enumerate(lines):
+        draw.text((margin, margin + number * line_height), line, font=font, fill=0)
+    if rotation:
+        image = image.rotate(rotation, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    image = _add_noise(image, noise, rng)
+    
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue(), "\n".join(lines)
+
+def build_corpus(directory, quick=False, seed=42):
+    """
+    Render the synthetic corpus into directory and write its manifest
+    
+    Args:
+        directory: Output directory, created if needed
+        quick: Only render the smallest page size without noise
+        seed: Base random seed
+    
+    Returns:
+        dict: The manifest, with a "signature" identifying the corpus and one
+        entry per page
+    """
+    os.makedirs(directory, exist_ok=True)
+    page_sizes = list(PAGE_SIZES)[:1] if quick else list(PAGE_SIZES)
+    noise_levels = NOISE_LEVELS[:1] if quick else NOISE_LEVELS
+    
+    pages = []
+    for language in LANGUAGES:
+        for dpi in DPIS:
+            for page_size in page_sizes:
+                for rotation in ROTATIONS:
+                    for noise in noise_levels:
+                        name = f"{language}-{page_size}-{dpi}dpi-rot{rotation}-noise{noise}.png"
+                        image_bytes, text = render_page(language, dpi, page_size, rotation, noise, seed + len(pages))
+                        with open(os.path.join(directory, name), "wb") as f:
+                            f.write(image_bytes)
+                        pages.append({
+                            "file": name,
+                            "language": language,
+                            "dpi": dpi,
+                            "page_size": page_size,
+                            "rotation": rotation,
+                            "noise": noise,
+                            "bytes": len(image_bytes),
+                            "text": text
+                        })
+    
+    signature = hashlib.sha256(json.dumps(pages, sort_keys=True).encode()).hexdigest()[:16]
+    manifest = {"signature": signature, "seed": seed, "quick": quick, "pages": pages}
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def _edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def character_error_rate(truth, text):
+    """Edit distance between the OCR text and the ground truth, per ground truth character, ignoring whitespace layout"""
+    truth = " ".join(truth.split())
+    text = " ".join((text or "").split())
+    if not truth:
+        return 0.0 if not text else 1.0
+    return _edit_distance(truth, text) / float(len(truth))
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, int(math.ceil(fraction * len(ordered))) - 1)]
+
+def _peak_rss_mb():
+    """Largest resident set size of this process and of any waited-for child, in MB, or None on Windows"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+def _request_fields(scenario, page):
+    """Build the OCR request options a scenario uses for a page"""
+    language = scenario.get("language", "eng+ind")
+    fields = {"language": page["language"] if language == "page" else language}
+    if scenario.get("preprocess"):
+        fields["preprocess"] = scenario["preprocess"]
+    if scenario.get("detect_language"):
+        fields["detect_language"] = True
+    return fields
+
+def _run_oneshot(pages, images, scenario):
+    """Start one ocr_service.py process per page, as lib/ocr.ts does with OCR_ONE_SHOT"""
+    latencies, results = [], []
+    for page, image_bytes in zip(pages, images):
+        header = dict(_request_fields(scenario, page), length=len(image_bytes))
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, SERVICE_PATH, "--binary"],
+                                   input=json.dumps(header).encode() + b"\n" + image_bytes,
+                                   stdout=subprocess.PIPE, check=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+        lines = completed.stdout.decode().strip().splitlines()
+        results.append(json.loads(lines[-1]) if lines else {"success": False, "error": "No output"})
+    return latencies, results, {}
+
+def _run_serve(pages, images, scenario):
+    """Send every page to one ocr_service.py --serve process, keeping one request in flight per worker"""
+    workers = scenario.get("workers", 1)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SERVICE_PATH, "--serve", "--workers", str(workers)],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    
+    # Wait for the service to answer before timing pages, so startup is reported separately
+    process.stdin.write(json.dumps({"operation": "cache_stats", "id": "ready"}).encode() + b"\n")
+    process.stdin.flush()
+    process.stdout.readline()
+    startup_seconds = time.perf_counter() - started
+    
+    sent_at = {}
+    latencies = [None] * len(pages)
+    results = [None] * len(pages)
+    
+    def send(index):
+        header = dict(_request_fields(scenario, pages[index]), id=index, length=len(images[index]))
+        sent_at[index] = time.perf_counter()
+        process.stdin.write(json.dumps(header).encode() + b"\n" + images[index])
+        process.stdin.flush()
+    
+    next_index = 0
+    while next_index < min(workers, len(pages)):
+        send(next_index)
+        next_index += 1
+    for _ in range(len(pages)):
+        response = json.loads(process.stdout.readline())
+        index = response.pop("id")
+        latencies[index] = (time.perf_counter() - sent_at[index]) * 1000
+        results[index] = response
+        if next_index < len(pages):
+            send(next_index)
+            next_index += 1
+    
+    process.stdin.close()
+    process.wait()
+    return latencies, results, {"startup_seconds": round(startup_seconds, 3)}
+
+def _run_inprocess(pages, images, scenario):
+    """Call process_image directly, which is the only way to vary the tesseract config"""
+    config = scenario.get("config", ocr_service.DEFAULT_CONFIG)
+    
+    def run(index):
+        fields = _request_fields(scenario, pages[index])
+        started = time.perf_counter()
+        result = ocr_service.process_image(images[index], fields["language"], config,
+                                           preprocess=fields.get("preprocess"),
+                                           detect=fields.get("detect_language", False))
+        return (time.perf_counter() - started) * 1000, result
+    
+    with ThreadPoolExecutor(max_workers=scenario.get("workers", 1)) as pool:
+        timed = list(pool.map(run, range(len(pages))))
+    return [latency for latency, _ in timed], [result for _, result in timed], {}
+
+RUNNERS = {"oneshot": _run_oneshot, "serve": _run_serve, "inprocess": _run_inprocess}
+
+def _group_mean(pages, values, field):
+    """Average values per distinct value of a page field"""
+    groups = {}
+    for page, value in zip(pages, values):
+        groups.setdefault(str(page[field]), []).append(value)
+    return {key: round(sum(group) / len(group), 4) for key, group in groups.items()}
+
+def run_scenario(scenario, corpus_dir):
+    """
+    Run one scenario over the corpus in this process
+    
+    Args:
+        scenario: Entry of SCENARIOS
+        corpus_dir: Directory written by build_corpus
+    
+    Returns:
+        dict: Latency percentiles, throughput, peak RSS, character error rate
+        (overall and per corpus dimension) and, with language detection, the
+        share of pages whose language was detected correctly
+    """
+    with open(os.path.join(corpus_dir, "manifest.json")) as f:
+        pages = json.load(f)["pages"]
+    images = []
+    for page in pages:
+        with open(os.path.join(corpus_dir, page["file"]), "rb") as f:
+            images.append(f.read())
+    
+    started = time.perf_counter()
+    latencies, results, extra = RUNNERS[scenario["mode"]](pages, images, scenario)
+    wall_seconds = time.perf_counter() - started - extra.get("startup_seconds", 0)
+    
+    errors = [result.get("error") for result in results if not result.get("success")]
+    cer = [character_error_rate(page["text"], result.get("text")) for page, result in zip(pages, results)]
+    report = dict(scenario)
+    report.update({
+        "pages": len(pages),
+        "errors": len(errors),
+        "p50_ms": round(_percentile(latencies, 0.5), 1),
+        "p95_ms": round(_percentile(latencies, 0.95), 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 1),
+        "wall_seconds": round(wall_seconds, 3),
+        "pages_per_sec": round(len(pages) / wall_seconds, 3) if wall_seconds else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "cer": round(sum(cer) / len(cer), 4),
+        "cer_by": {field: _group_mean(pages, cer, field)
+                   for field in ("language", "dpi", "page_size", "rotation", "noise")}
+    })
+    report.update(extra)
+    if errors:
+        report["first_error"] = errors[0]
+    if scenario.get("detect_language"):
+        detected = [result.get("language") == page["language"] for page, result in zip(pages, results)]
+        report["language_accuracy"] = round(sum(detected) / float(len(detected)), 3)
+        detection_ms = [result["language_detection"]["ms"] for result in results if result.get("language_detection")]
+        if detection_ms:
+            report["detection_p50_ms"] = round(_percentile(detection_ms, 0.5), 1)
+    return report
+
+def _run_isolated(scenario, corpus_dir):
+    """Run a scenario in a fresh interpreter, so peak RSS and warm state don't leak between scenarios"""
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-scenario", json.dumps(scenario),
+                                "--corpus-dir", corpus_dir], stdout=subprocess.PIPE, check=False)
+    try:
+        return json.loads(completed.stdout.decode().strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return dict(scenario, error=f"Scenario exited with code {completed.returncode}")
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE, names=None):
+    """
+    Compare a report with a baseline report
+    
+    Latency and peak RSS regress when they grow by more than tolerance,
+    throughput when it drops by more than tolerance, and character error rate
+    when it grows by more than CER_TOLERANCE in absolute terms. A scenario
+    that crashed, failed more pages than in the baseline, or is in the
+    baseline but missing from the report is a regression too.
+    
+    Args:
+        report: Report from run_benchmark
+        baseline: Earlier report
+        tolerance: Allowed relative change of latency, RSS and throughput
+        names: Scenarios that were meant to run (default: all in the baseline)
+        
+    Returns:
+        dict: Per-scenario metric changes, the list of "regressions" and
+        whether the two reports used the same corpus
+    """
+    previous = {scenario["name"]: scenario for scenario in baseline.get("scenarios", [])}
+    ran = {scenario["name"] for scenario in report["scenarios"]}
+    expected = previous if names is None else [name for name in names if name in previous]
+    comparison = {
+        "tolerance": tolerance,
+        "corpus_matches": report["corpus"]["signature"] == baseline.get("corpus", {}).get("signature"),
+        "scenarios": {},
+        "regressions": [],
+        "missing": [name for name in expected if name not in ran]
+    }
+    for name in comparison["missing"]:
+        comparison["regressions"].append({"scenario": name, "metric": "missing"})
+    
+    for scenario in report["scenarios"]:
+        if scenario.get("error"):
+            comparison["regressions"].append({"scenario": scenario["name"], "metric": "error",
+                                              "current": scenario["error"]})
+            continue
+        old = previous.get(scenario["name"])
+        if not old:
+            continue
+        changes = {}
+        if scenario.get("errors", 0) > old.get("errors", 0):
+            changes["errors"] = {"baseline": old.get("errors", 0), "current": scenario["errors"]}
+            comparison["regressions"].append(dict(changes["errors"], scenario=scenario["name"], metric="errors"))
+        for metric, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("peak_rss_mb", True),
+                                        ("pages_per_sec", False), ("cer", True)):
+            if scenario.get(metric) is None or old.get(metric) is None:
+                continue
+            current, before = scenario[metric], old[metric]
+            change = (current - before) / before if before else 0.0
+            changes[metric] = {"baseline": before, "current": current, "change": round(change, 3)}
+            if metric == "cer":
+                regressed = current - before > CER_TOLERANCE
+            elif higher_is_worse:
+                regressed = change > tolerance
+            else:
+                regressed = change < -tolerance
+            if regressed:
+                comparison["regressions"].append(dict(changes[metric], scenario=scenario["name"], metric=metric))
+        comparison["scenarios"][scenario["name"]] = changes
+    return comparison
+
+def run_benchmark(scenarios, corpus_dir, quick=False):
+    """Build the corpus and run each scenario in its own process"""
+    manifest = build_corpus(corpus_dir, quick=quick)
+    try:
+        tesseract_version = str(pytesseract.get_tesseract_version())
+    except Exception:
+        tesseract_version = None
+    
+    return {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "tesseract": tesseract_version
+        },
+        "corpus": {
+            "signature": manifest["signature"],
+            "pages": len(manifest["pages"]),
+            "quick": quick,
+            "bytes": sum(page["bytes"] for page in manifest["pages"])
+        },
+        "scenarios": [_run_isolated(scenario, corpus_dir) for scenario in scenarios]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR benchmark on a synthetic document corpus")
+    parser.add_argument("--scenarios", help="Comma-separated scenario names to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="Render a small corpus of the smallest page size without noise")
+    parser.add_argument("--corpus-dir", help="Directory for the rendered corpus (default: a temporary directory)")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="Compare with a previous report and exit with status 1 on regressions")
+    parser.add_argument("--save-baseline", help="Also write the report to this file as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative change before a metric regresses")
+    parser.add_argument("--list", action="store_true", help="List the available scenarios")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.run_scenario:
+        print(json.dumps(run_scenario(json.loads(args.run_scenario), args.corpus_dir)))
+        sys.exit(0)
+    
+    if args.list:
+        for scenario in SCENARIOS:
+            print(scenario["name"])
+        sys.exit(0)
+    
+    scenarios = SCENARIOS
+    if args.scenarios:
+        names = args.scenarios.split(",")
+        scenarios = [scenario for scenario in SCENARIOS if scenario["name"] in names]
+        unknown = set(names) - {scenario["name"] for scenario in scenarios}
+        if unknown:
+            print(f"Unknown scenarios: {', '.join(sorted(unknown))}", file=sys.stderr)
+            sys.exit(1)
+    
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="ocr_benchmark_")
+    report = run_benchmark(scenarios, corpus_dir, quick=args.quick)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance,
+                                           [scenario["name"] for scenario in scenarios])
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(output + "\n")
+    
+    if report.get("comparison", {}).get("regressions"):
+        sys.exit(1)
@@ -0,0 +1,534 @@
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import sqlite3
+import argparse
+import datetime
+import threading
+import ocr_service
+import jsonl_server
+
+# Job queue settings
+QUEUE_PATH = os.environ.get('OCR_QUEUE_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), '.ocr_queue', 'jobs.sqlite3'))
+QUEUE_MAX_DEPTH = int(os.environ.get('OCR_QUEUE_MAX_DEPTH', 500))
+QUEUE_WORKERS = int(os.environ.get('OCR_QUEUE_WORKERS', os.cpu_count() or 1))
+# A job that was running this many times without finishing (for example because
+# it crashed the worker) is failed on restart instead of being retried forever
+MAX_ATTEMPTS = int(os.environ.get('OCR_QUEUE_MAX_ATTEMPTS', 3))
+# Share of max_depth kept free for interactive jobs while a bulk batch fills the queue
+INTERACTIVE_RESERVE = float(os.environ.get('OCR_QUEUE_INTERACTIVE_RESERVE', 0.1))
+# Running jobs hold a lease that their process renews; once it expires the job
+# is assumed to be abandoned and is queued again
+LEASE_SECONDS = float(os.environ.get('OCR_QUEUE_LEASE_SECONDS', 60))
+POLL_INTERVAL = 0.5
+
+# Higher priorities run first; interactive single uploads go ahead of bulk batches
+PRIORITIES = {"interactive": 10, "batch": 0}
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+def _timestamp(value):
+    """Format a stored epoch time for API responses"""
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).isoformat()
+
+def _priority(priority):
+    """Accept a priority name from PRIORITIES or a plain number"""
+    if isinstance(priority, str):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        return PRIORITIES[priority]
+    return int(priority)
+
+class JobQueue:
+    """
+    OCR job queue stored in SQLite
+    
+    Jobs survive restarts: a running job holds a lease renewed by its process,
+    and recover queues it again once the lease expires, so jobs of a stopped
+    process resume while jobs of live processes are left alone. The queue refuses new work once queued plus
+    running jobs reach max_depth, so a spike is pushed back to the caller
+    instead of piling up. A batch is accepted or refused as a whole, and
+    lower-priority jobs leave INTERACTIVE_RESERVE of the queue free, so
+    interactive uploads are only refused when the queue is completely full.
+    """
+    
+    def __init__(self, path=QUEUE_PATH, max_depth=QUEUE_MAX_DEPTH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_depth = max_depth
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.changed = threading.Condition()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY, batch_id TEXT, priority INTEGER NOT NULL, status TEXT NOT NULL, "
+                "image BLOB, image_path TEXT, options TEXT NOT NULL, result TEXT, error TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL, owner TEXT, lease_until REAL, image_id INTEGER)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_next ON jobs (status, priority DESC, id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+    
+    def _notify(self):
+        with self.changed:
+            self.changed.notify_all()
+    
+    def depth(self):
+        """Return the number of queued and running jobs"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+    
+    def _row(self, item, priority, batch_id, now):
+        """Turn a job request into a jobs table row"""
+        image = item.get("image")
+        image_path = item.get("image_path")
+        if not image and not image_path:
+            raise ValueError("No image data provided")
+        if image:
+            image = base64.b64decode(image.split(',')[1] if ',' in image else image)
+        options = {key: item[key] for key in ("language", "preprocess", "detect_language", "save") if key in item}
+        return (batch_id, priority, "queued", image, image_path, json.dumps(options), now)
+    
+    def submit(self, item, priority="interactive"):
+        """
+        Queue one OCR job
+        
+        Args:
+            item: {"image"} base64 data or {"image_path"}, plus optional
+                "language", "preprocess", "detect_language", and "save":
+                {"name", "image_path"} to store the text with add_image
+            priority: Name from PRIORITIES or a number, higher runs first
+        
+        Returns:
+            dict: The job "id", or an error with "retry_after" seconds when
+            the queue is full
+        """
+        result = self.submit_batch([item], priority, batch_id=None)
+        if result["success"]:
+            return {"success": True, "id": result["ids"][0], "depth": result["depth"]}
+        return result
+    
+    def submit_batch(self, items, priority="batch", batch_id=None):
+        """
+        Queue a batch of OCR jobs, all or none
+        
+        Returns:
+            dict: The "batch_id" and job "ids" in input order, or an error with
+            "retry_after" seconds when the batch does not fit in the queue
+        """
+        try:
+            priority = _priority(priority)
+            now = time.time()
+            if batch_id is None and len(items) > 1:
+                batch_id = f"batch-{int(now * 1000)}-{os.getpid()}-{threading.get_ident()}"
+            rows = [self._row(item, priority, batch_id, now) for item in items]
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        
+        with self.lock, self.connection:
+            depth = self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+            limit = self.max_depth
+            if priority < PRIORITIES["interactive"]:
+                limit -= max(1, int(self.max_depth * INTERACTIVE_RESERVE))
+            if depth + len(rows) > limit:
+                return {
+                    "success": False,
+                    "error": "OCR queue is full",
+                    "depth": depth,
+                    "retry_after": self._retry_after(depth + len(rows) - limit)
+                }
+            ids = [self.connection.execute(
+                "INSERT INTO jobs (batch_id, priority, status, image, image_path, options, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", row
+            ).lastrowid for row in rows]
+        self._notify()
+        return {"success": True, "batch_id": batch_id, "ids": ids, "depth": depth + len(ids)}
+    
+    def _retry_after(self, excess):
+        """Estimate how long until excess jobs have left the queue, from recent job durations"""
+        row = self.connection.execute(
+            "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+            "WHERE status = 'done' ORDER BY finished_at DESC LIMIT 50)"
+        ).fetchone()
+        seconds_per_job = row[0] or 1.0
+        return max(1, int(round(seconds_per_job * excess / max(1, QUEUE_WORKERS))))
+    
+    def _job(self, row, include_result=False):
+        job = {
+            "id": row["id"],
+            "batch_id": row["batch_id"],
+            "priority": row["priority"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": _timestamp(row["created_at"]),
+            "started_at": _timestamp(row["started_at"]),
+            "finished_at": _timestamp(row["finished_at"])
+        }
+        if row["status"] == "queued":
+            job["position"] = self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND id < ?))",
+                (row["priority"], row["priority"], row["id"])
+            ).fetchone()[0]
+        if row["started_at"]:
+            job["queued_ms"] = round((row["started_at"] - row["created_at"]) * 1000, 1)
+        if row["finished_at"] and row["started_at"]:
+            job["run_ms"] = round((row["finished_at"] - row["started_at"]) * 1000, 1)
+        if row["error"]:
+            job["error"] = row["error"]
+        if include_result and row["result"]:
+            job["result"] = json.loads(row["result"])
+        return job
+    
+    def status(self, id):
+        """Return a job's status, without its result"""
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM jobs WHERE id = ?", (int(id),)).fetchone()
+            if not row:
+                return {"success": False, "error": "Job not found"}
+            return {"success": True, "data": self._job(row)}
+    
+    def result(self, id, wait=0):
+        """
+        Return a job's status and, once done, its OCR result
+        
+        Args:
+            id: Job id
+            wait: Seconds to wait for the job to finish before returning
+        """
+        deadline = time.time() + float(wait or 0)
+        while True:
+            with self.lock:
+                row = self.connection.execute("SELECT * FROM jobs WHERE id = ?", (int(id),)).fetchone()
+                if not row:
+                    return {"success": False, "error": "Job not found"}
+                job = self._job(row, include_result=True)
+            remaining = deadline - time.time()
+            if job["status"] not in ("queued", "running") or remaining <= 0:
+                return {"success": True, "data": job}
+            # Jobs may finish in another process, so don't rely on notifications alone
+            with self.changed:
+                self.changed.wait(min(remaining, POLL_INTERVAL))
+    
+    def batch_status(self, batch_id):
+        """Count a batch's jobs by status"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        if not rows:
+            return {"success": False, "error": "Batch not found"}
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return {"success": True, "data": {"batch_id": batch_id, "total": sum(counts.values()), "counts": counts}}
+    
+    def cancel(self, id=None, batch_id=None):
+        """Cancel a queued job, or every queued job of a batch; running jobs finish normally"""
+        with self.lock, self.connection:
+            if batch_id is not None:
+                cursor = self.connection.execute(
+                    "UPDATE jobs SET status = 'cancelled', image = NULL, finished_at = ? "
+                    "WHERE batch_id = ? AND status = 'queued'", (time.time(), batch_id)
+                )
+                return {"success": True, "cancelled": cursor.rowcount}
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'cancelled', image = NULL, finished_at = ? "
+                "WHERE id = ? AND status = 'queued'", (time.time(), int(id))
+            )
+            if cursor.rowcount:
+                return {"success": True, "cancelled": 1}
+            row = self.connection.execute("SELECT status FROM jobs WHERE id = ?", (int(id),)).fetchone()
+        if not row:
+            return {"success": False, "error": "Job not found"}
+        return {"success": False, "error": f"Job is already {row['status']}"}
+    
+    def claim(self):
+        """Mark the next queued job as running and return it, or None when the queue is empty"""
+        with self.lock:
+            try:
+                # Take the write lock up front, so two processes never claim the same job
+                self.connection.execute("BEGIN IMMEDIATE")
+                row = self.connection.execute(
+                    "SELECT id, image, image_path, options, image_id FROM jobs WHERE status = 'queued' "
+                    "ORDER BY priority DESC, id LIMIT 1"
+                ).fetchone()
+                if row:
+                    now = time.time()
+                    self.connection.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, "
+                        "owner = ?, lease_until = ? WHERE id = ?",
+                        (now, self.owner, now + LEASE_SECONDS, row["id"])
+                    )
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+        if not row:
+            return None
+        return {"id": row["id"], "image": row["image"], "image_path": row["image_path"],
+                "options": json.loads(row["options"]), "image_id": row["image_id"]}
+    
+    def renew(self):
+        """Extend the leases of the jobs this process is running"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + LEASE_SECONDS, self.owner)
+            )
+    
+    def mark_saved(self, id, image_id):
+        """Remember the image row a job saved, so a resumed job doesn't save it again"""
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE jobs SET image_id = ? WHERE id = ?", (image_id, int(id)))
+    
+    def finish(self, id, result):
+        """
+        Store a job's result; unsuccessful results mark the job as failed
+        
+        Ignored when this process no longer owns the job because its lease
+        expired and the job was queued again.
+        """
+        status = "done" if result.get("success") else "failed"
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, image = NULL, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                (status, json.dumps(result), result.get("error"), time.time(), int(id), self.owner)
+            )
+        self._notify()
+    
+    def recover(self):
+        """
+        Requeue running jobs whose lease expired, so batches of a stopped process resume
+        
+        Jobs of live processes keep renewing their leases and are left alone.
+        Jobs that already used MAX_ATTEMPTS attempts are failed instead.
+        
+        Returns:
+            dict: Number of "requeued" and "failed" jobs
+        """
+        now = time.time()
+        expired = "status = 'running' AND (lease_until IS NULL OR lease_until < ?)"
+        with self.lock, self.connection:
+            failed = self.connection.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted too many times', image = NULL, "
+                f"finished_at = ?, lease_until = NULL WHERE {expired} AND attempts >= ?", (now, now, MAX_ATTEMPTS)
+            ).rowcount
+            requeued = self.connection.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_until = NULL "
+                f"WHERE {expired}", (now,)
+            ).rowcount
+        self._notify()
+        return {"requeued": requeued, "failed": failed}
+    
+    def purge(self, older_than=7 * 24 * 60 * 60):
+        """Delete finished jobs older than older_than seconds"""
+        with self.lock, self.connection:
+            deleted = self.connection.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                (time.time() - older_than,)
+            ).rowcount
+        return {"success": True, "deleted": deleted}
+    
+    def stats(self):
+        """Count jobs by status"""
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return {
+            "counts": counts,
+            "depth": counts["queued"] + counts["running"],
+            "max_depth": self.max_depth
+        }
+
+def _save_result(text, save):
+    """Store OCR text with add_image; db_operations is imported lazily because it needs Supabase credentials"""
+    try:
+        import db_operations
+    except SystemExit:
+        return {"success": False, "error": "Missing Supabase credentials in environment variables"}
+    return db_operations.add_image(save.get("name"), save.get("image_path"), text)
+
+def run_job(job, queue=None):
+    """
+    Run one claimed job with process_image or process_image_file
+    
+    A job that already saved its text before being interrupted reuses that
+    image row instead of calling add_image again.
+    
+    Args:
+        job: Job returned by JobQueue.claim
+        queue: JobQueue to record the saved image id on before the job finishes
+    
+    Returns:
+        dict: The OCR result, plus "image_id" when the job saved its text
+    """
+    options = job["options"]
+    language = options.get("language", "eng+ind")
+    preprocess = options.get("preprocess")
+    detect = bool(options.get("detect_language"))
+    
+    if job["image"] is not None:
+        result = ocr_service.process_image(bytes(job["image"]), language, preprocess=preprocess, detect=detect)
+    else:
+        result = ocr_service.process_image_file(job["image_path"], language, preprocess=preprocess, detect=detect)
+    
+    if result.get("success") and options.get("save"):
+        if job.get("image_id"):
+            return dict(result, image_id=job["image_id"])
+        saved = _save_result(result["text"], options["save"])
+        if not saved.get("success"):
+            return dict(result, success=False, error=f"OCR succeeded but saving failed: {saved.get('error')}")
+        if queue:
+            queue.mark_saved(job["id"], saved["id"])
+        result = dict(result, image_id=saved["id"])
+    return result
+
+def start_workers(queue, workers=QUEUE_WORKERS, stop=None):
+    """
+    Start a bounded pool of worker threads draining the queue
+    
+    The pool size caps how many jobs run at once.
+    
+    A heartbeat thread renews the leases of running jobs and requeues jobs
+    whose lease expired, including those of processes that stopped meanwhile.
+    
+    Args:
+        queue: JobQueue
+        workers: Number of worker threads
+        stop: Optional threading.Event; workers exit once it is set
+    
+    Returns:
+        list: The started worker threads
+    """
+    stop = stop or threading.Event()
+    
+    def heartbeat():
+        while not stop.wait(LEASE_SECONDS / 3):
+            try:
+                queue.renew()
+                recovered = queue.recover()
+                if recovered["requeued"] or recovered["failed"]:
+                    print(f"Recovered interrupted jobs: {json.dumps(recovered)}", file=sys.stderr)
+            except sqlite3.Error as e:
+                print(f"Queue heartbeat failed: {e}", file=sys.stderr)
+    
+    def work():
+        while not stop.is_set():
+            try:
+                job = queue.claim()
+            except sqlite3.Error as e:
+                # For example "database is locked"; back off instead of losing the worker
+                print(f"Queue worker failed to claim a job: {e}", file=sys.stderr)
+                stop.wait(POLL_INTERVAL)
+                continue
+            if job is None:
+                with queue.changed:
+                    queue.changed.wait(POLL_INTERVAL)
+                continue
+            try:
+                result = run_job(job, queue)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            # Keep retrying, the heartbeat renews this job's lease meanwhile
+            while not stop.is_set():
+                try:
+                    queue.finish(job["id"], result)
+                    break
+                except sqlite3.Error as e:
+                    print(f"Queue worker failed to finish job {job['id']}: {e}", file=sys.stderr)
+                    stop.wait(POLL_INTERVAL)
+    
+    threads = [threading.Thread(target=work, name=f"ocr-queue-{index}", daemon=True) for index in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    threading.Thread(target=heartbeat, name="ocr-queue-heartbeat", daemon=True).start()
+    return threads
+
+def handle_request(queue, data):
+    """
+    Dispatch a queue operation
+    
+    Operations: submit, submit_batch, status, result (with optional "wait"
+    seconds), batch_status, cancel (by "id" or "batch_id"), purge and stats.
+    """
+    operation = data.get("operation")
+    
+    if operation == "submit":
+        return queue.submit(data, data.get("priority", "interactive"))
+    elif operation == "submit_batch":
+        return queue.submit_batch(data.get("images") or [], data.get("priority", "batch"), data.get("batch_id"))
+    elif operation == "status":
+        return queue.status(data.get("id"))
+    elif operation == "result":
+        return queue.result(data.get("id"), data.get("wait", 0))
+    elif operation == "batch_status":
+        return queue.batch_status(data.get("batch_id"))
+    elif operation == "cancel":
+        return queue.cancel(data.get("id"), data.get("batch_id"))
+    elif operation == "purge":
+        return queue.purge(data.get("older_than", 7 * 24 * 60 * 60))
+    elif operation == "stats":
+        return {"success": True, "data": queue.stats()}
+    else:
+        return {"success": False, "error": f"Unknown operation: {operation}"}
+
+def serve(queue, workers=QUEUE_WORKERS):
+    """
+    Serve queue operations as newline-delimited JSON over stdin/stdout while draining the queue
+    
+    Each input line is a request object with an optional "request_id" which
+    is echoed back on the matching response line ("id" names the job).
+    Requests are answered in order, except those that wait for a result,
+    which get their own thread so they don't hold up other requests.
+    """
+    start_workers(queue, workers)
+    jsonl_server.serve(lambda data, emit, payload: handle_request(queue, data), workers=1,
+                       detached=lambda data: data.get("operation") == "result" and data.get("wait"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite-backed OCR job queue")
+    parser.add_argument("--serve", action="store_true", help="Serve newline-delimited JSON requests and run workers until stdin closes")
+    parser.add_argument("--worker", action="store_true", help="Only run workers, until interrupted")
+    parser.add_argument("--workers", type=int, default=QUEUE_WORKERS, help="Number of concurrent OCR jobs")
+    parser.add_argument("--path", default=QUEUE_PATH, help="Path of the queue database")
+    args = parser.parse_args()
+    
+    queue = JobQueue(args.path)
+    
+    if args.serve or args.worker:
+        recovered = queue.recover()
+        if recovered["requeued"] or recovered["failed"]:
+            print(f"Recovered interrupted jobs: {json.dumps(recovered)}", file=sys.stderr)
+    
+    if args.serve:
+        serve(queue, args.workers)
+        sys.exit(0)
+    
+    if args.worker:
+        try:
+            for thread in start_workers(queue, args.workers):
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    
+    try:
+        # Read a single operation from stdin
+        result = handle_request(queue, json.loads(sys.stdin.read()))
+        print(json.dumps(result))
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
@@ -1,10 +1,27 @@
 import os
+import re
 import sys
 import json
+import mmap
+import time
 import base64
-from PIL import Image
+import shutil
+import hashlib
+import sqlite3
+import subprocess
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageChops, ImageFilter, ImageSequence
 import pytesseract
 import io
+import metrics
+import jsonl_server
+from jsonl_server import read_frame
 
 # Configure Tesseract to use custom tessdata directory
 TESSDATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tessdata')
@@ -13,37 +30,1067 @@ if not os.path.exists(TESSDATA_DIR):
 pytesseract.pytesseract.tesseract_cmd = r'tesseract'  # Make sure this points to your tesseract executable
 os.environ['TESSDATA_PREFIX'] = TESSDATA_DIR
 
-def process_image(image_data, language="eng+ind"):
+# OMP_THREAD_LIMIT for the tesseract processes started by the current thread only,
+# so one request's thread share never leaks into the rest of serve mode
+_tesseract_env = threading.local()
+_pytesseract_subprocess_args = pytesseract.pytesseract.subprocess_args
+
+def _tesseract_subprocess_args(include_stdout=True):
+    kwargs = _pytesseract_subprocess_args(include_stdout)
+    thread_limit = getattr(_tesseract_env, "thread_limit", None)
+    if thread_limit:
+        kwargs['env'] = dict(kwargs['env'], OMP_THREAD_LIMIT=str(thread_limit))
+    return kwargs
+
+pytesseract.pytesseract.subprocess_args = _tesseract_subprocess_args
+
+@contextmanager
+def tesseract_thread_limit(threads):
+    """Limit the threads of tesseract runs on this thread, unless OMP_THREAD_LIMIT is set for the process"""
+    if not threads or 'OMP_THREAD_LIMIT' in os.environ:
+        yield
+        return
+    _tesseract_env.thread_limit = threads
+    try:
+        yield
+    finally:
+        _tesseract_env.thread_limit = None
+
+# Configure OCR options for better accuracy
+DEFAULT_CONFIG = r'--oem 1 --psm 3'
+
+# Prometheus metrics for serve mode, enabled with METRICS_ENABLED
+METRICS = metrics.Registry("ocr")
+METRICS.describe("requests_total", "OCR requests handled, by operation and status")
+METRICS.describe("request_duration_seconds", "Time spent handling OCR requests, by operation")
+METRICS.describe("stage_duration_seconds", "Time spent in each stage of OCR requests")
+METRICS.describe("queue_wait_seconds", "Time requests waited for a free worker in serve mode")
+METRICS.describe("image_bytes_total", "Encoded image bytes received")
+
+# Poppler tools used to rasterize PDF pages, if installed
+PDFTOPPM_CMD = shutil.which('pdftoppm')
+PDFINFO_CMD = shutil.which('pdfinfo')
+
+# OCR result cache settings
+CACHE_DIR = os.environ.get('OCR_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), '.ocr_cache'))
+CACHE_ENABLED = os.environ.get('OCR_CACHE_DISABLED', '').lower() not in ('1', 'true', 'yes')
+CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+CACHE_MAX_AGE = int(os.environ.get('OCR_CACHE_MAX_AGE', 30 * 24 * 60 * 60))
+
+class OCRCache:
+    """
+    Content-addressed OCR result cache stored in SQLite
+    
+    Entries are keyed by a hash of the decoded image bytes, the language and the
+    tesseract config string. Entries older than max_age seconds are dropped and
+    the least recently used entries are evicted once the cache grows past
+    max_bytes. Hit and miss counters are persisted alongside the entries.
+    """
+    
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(cache_dir, 'ocr_cache.sqlite3'),
+                                          timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    
+    @staticmethod
+    def make_key(image_bytes, language, config, options=None):
+        """Build the cache key for an image, language, tesseract config and preprocessing options"""
+        digest = hashlib.sha256(image_bytes)
+        digest.update(b'\0' + language.encode() + b'\0' + config.encode())
+        if options:
+            digest.update(b'\0' + json.dumps(options, sort_keys=True).encode())
+        return digest.hexdigest()
+    
+    def _count(self, name):
+        self.connection.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,)
+        )
+    
+    def get(self, key):
+        """Return the cached result for key, or None on a miss"""
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT result FROM entries WHERE key = ? AND created_at >= ?",
+                (key, now - self.max_age)
+            ).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            self.connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count('hits')
+        return json.loads(row[0])
+    
+    def put(self, key, result):
+        """Store a result and evict expired and least recently used entries"""
+        now = time.time()
+        payload = json.dumps(result)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, result, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)", (key, payload, len(payload), now, now)
+            )
+            self.connection.execute("DELETE FROM entries WHERE created_at < ?", (now - self.max_age,))
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                evict = []
+                for entry_key, size in self.connection.execute(
+                        "SELECT key, size FROM entries ORDER BY accessed_at"):
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((entry_key,))
+                    total -= size
+                self.connection.executemany("DELETE FROM entries WHERE key = ?", evict)
+                self.connection.execute(
+                    "INSERT INTO stats (name, value) VALUES ('evictions', ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (len(evict),)
+                )
+    
+    def stats(self):
+        """Return hit/miss counters and the current cache size"""
+        with self.lock:
+            counters = dict(self.connection.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get('evictions', 0),
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age
+        }
+
+_cache = None
+_cache_pid = None
+
+def get_cache():
+    """Return this process's OCR cache, or None when caching is disabled"""
+    global _cache, _cache_pid
+    if not CACHE_ENABLED:
+        return None
+    # Pool workers are forked, so never reuse a connection opened by the parent
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = OCRCache()
+        _cache_pid = os.getpid()
+    return _cache
+
+@contextmanager
+def _spill_to_file(image_bytes):
+    """Write raw image bytes to a temporary file so tesseract can read them directly"""
+    handle, path = tempfile.mkstemp(prefix='ocr_')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(image_bytes)
+        yield path
+    finally:
+        os.remove(path)
+
+PREPROCESS_STEPS = ("downscale", "grayscale", "deskew", "binarize", "crop")
+
+# A "line" taller than this share of the page is a merged block of lines, not text
+MAX_TEXT_HEIGHT_SHARE = 0.25
+
+def _otsu_threshold(gray):
+    """Compute Otsu's threshold from the histogram of a grayscale image"""
+    histogram = gray.histogram()
+    total = sum(histogram)
+    sum_total = sum(value * count for value, count in enumerate(histogram))
+    sum_background = 0
+    weight_background = 0
+    best_threshold, best_variance = 127, -1.0
+    for value, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += value * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_total - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = value, variance
+    return best_threshold
+
+def _ink_mask(gray):
+    """Return a mask that is 255 where the grayscale image has ink and 0 elsewhere"""
+    threshold = _otsu_threshold(gray)
+    return gray.point(lambda value: 255 if value <= threshold else 0)
+
+def _row_profile(mask):
+    """Return the mean ink per row, computed by PIL rather than a Python loop"""
+    return list(mask.resize((1, mask.height), Image.BOX).getdata())
+
+def _skew_angle(mask, max_angle=10):
+    """Find the rotation that makes text lines horizontal, searching on a small copy of an ink mask"""
+    mask = mask.copy()
+    mask.thumbnail((800, 800))
+    
+    # The sharpest row profile marks the skew angle
+    def score(angle):
+        profile = _row_profile(mask.rotate(angle, resample=Image.BILINEAR))
+        mean = sum(profile) / len(profile)
+        return sum((ink - mean) ** 2 for ink in profile)
+    
+    best_angle = max((angle for angle in range(-max_angle, max_angle + 1)), key=score)
+    return max((best_angle + step / 10.0 for step in range(-9, 10)), key=score)
+
+def _estimate_text_height(gray, max_angle=10):
+    """
+    Estimate the typical text line height in pixels from the row ink profile
+    
+    The profile is measured on a deskewed copy, because tilted lines overlap
+    in the rows and would merge into one block. Returns None when no lines are
+    found or the estimate is implausibly large for the page.
+    """
+    mask = _ink_mask(gray)
+    scale = min(1.0, 1600.0 / max(mask.size))
+    if scale < 1.0:
+        mask = mask.resize((max(1, int(mask.width * scale)), max(1, int(mask.height * scale))), Image.BOX)
+    angle = _skew_angle(mask, max_angle)
+    if abs(angle) >= 0.1:
+        mask = mask.rotate(angle, resample=Image.BILINEAR, expand=True)
+    
+    profile = _row_profile(mask)
+    min_ink = max(profile) * 0.05
+    runs, run = [], 0
+    for ink in profile:
+        if ink > min_ink:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    runs = [run for run in runs if run > 2]
+    if not runs:
+        return None
+    runs.sort()
+    height = runs[len(runs) // 2] / scale
+    if height > gray.height * MAX_TEXT_HEIGHT_SHARE:
+        return None
+    return int(round(height))
+
+def _downscale(image, options):
+    """Shrink the image so text lines are about target_text_height pixels tall, by at most min_scale"""
+    target_dpi = options.get("target_dpi", 300)
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and dpi[0] > target_dpi:
+        scale = target_dpi / float(dpi[0])
+    else:
+        text_height = _estimate_text_height(image.convert('L'))
+        target_height = options.get("target_text_height", 40)
+        scale = target_height / text_height if text_height else 1.0
+    scale = max(scale, options.get("min_scale", 0.25))
+    
+    max_pixels = options.get("max_pixels", 12000000)
+    if image.width * image.height * scale * scale > max_pixels:
+        scale = (max_pixels / float(image.width * image.height)) ** 0.5
+    
+    if scale >= 1.0:
+        return image
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+def _binarize(gray, options):
+    """Binarize a grayscale image with Otsu's or an adaptive (local mean) threshold"""
+    method = options.get("binarize", "otsu")
+    if method == "otsu":
+        threshold = _otsu_threshold(gray)
+        return gray.point(lambda value: 255 if value > threshold else 0)
+    if method == "adaptive":
+        radius = options.get("block_radius", 15)
+        offset = options.get("offset", 10)
+        local_mean = gray.filter(ImageFilter.BoxBlur(radius))
+        darker = ImageChops.subtract(local_mean, gray)
+        return darker.point(lambda value: 0 if value > offset else 255)
+    raise ValueError(f"Unknown binarization method: {method}")
+
+def _deskew(gray, options):
+    """Rotate a grayscale image so its text lines are horizontal"""
+    best_angle = _skew_angle(_ink_mask(gray), options.get("max_skew", 10))
+    if abs(best_angle) < 0.1:
+        return gray
+    return gray.rotate(best_angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+def _crop_borders(gray, options):
+    """Crop blank margins around the text, keeping a small padding"""
+    bbox = _ink_mask(gray).getbbox()
+    if not bbox:
+        return gray
+    padding = options.get("padding", 10)
+    left, top, right, bottom = bbox
+    return gray.crop((max(0, left - padding), max(0, top - padding),
+                      min(gray.width, right + padding), min(gray.height, bottom + padding)))
+
+def normalize_preprocess_options(preprocess):
+    """
+    Normalize the "preprocess" request field
+    
+    Accepts true (all steps), a list of step names, or a dict with "steps" and
+    per-step options. Returns None when no preprocessing was requested.
+    """
+    if not preprocess:
+        return None
+    if preprocess is True:
+        options = {}
+    elif isinstance(preprocess, (list, tuple)):
+        options = {"steps": list(preprocess)}
+    else:
+        options = dict(preprocess)
+    
+    steps = options.get("steps", list(PREPROCESS_STEPS))
+    unknown = [step for step in steps if step not in PREPROCESS_STEPS]
+    if unknown:
+        raise ValueError(f"Unknown preprocessing steps: {', '.join(unknown)}")
+    # Steps always run in pipeline order, whatever order they were given in
+    options["steps"] = [step for step in PREPROCESS_STEPS if step in steps]
+    return options
+
+def preprocess_image(image, options):
+    """
+    Prepare an image for OCR
+    
+    The selected steps run in this order: downscale, grayscale, deskew,
+    binarize, crop. Deskew, binarize and crop work on grayscale data and
+    convert the image first if needed.
+    
+    Args:
+        image: PIL image
+        options: Normalized preprocessing options
+    
+    Returns:
+        tuple: (processed image, list of {"step", "ms", "width", "height"} timings)
+    """
+    timings = []
+    for step in options["steps"]:
+        start = time.perf_counter()
+        if step == "downscale":
+            image = _downscale(image, options)
+        else:
+            if image.mode != 'L':
+                image = image.convert('L')
+            if step == "deskew":
+                image = _deskew(image, options)
+            elif step == "binarize":
+                image = _binarize(image, options)
+            elif step == "crop":
+                image = _crop_borders(image, options)
+        timings.append({
+            "step": step,
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+            "width": image.width,
+            "height": image.height
+        })
+    return image, timings
+
+# Common function words used to tell the supported languages apart
+STOPWORDS = {
+    "eng": set("""
+        the and of to in is that for it with as was on be by this are or from at an which
+        have not has but were they their you we will can all been more there if would about
+        when what your our these those other into than its also he she his her
+    """.split()),
+    "ind": set("""
+        yang dan di ke dari ini itu dengan untuk pada adalah dalam tidak akan ada oleh atau
+        juga sebagai karena kami kita saya anda mereka sudah telah bisa dapat lebih harus
+        secara tersebut bahwa para jika namun hanya baru masih sangat serta antara setelah
+        sebelum belum agar kepada bagi hingga tetapi nya
+    """.split())
+}
+
+def _sample_strip(image, max_lines=6):
+    """Cut a downscaled strip of about max_lines text lines from the inkiest part of the page"""
+    gray = _downscale(image.convert('L'), {"target_text_height": 32, "target_dpi": 200})
+    line_height = min(_estimate_text_height(gray) or 32, 64)
+    window = min(gray.height, line_height * max_lines)
+    profile = _row_profile(_ink_mask(gray))
+    
+    ink = sum(profile[:window])
+    best_top, best_ink = 0, ink
+    for top in range(1, gray.height - window + 1):
+        ink += profile[top + window - 1] - profile[top - 1]
+        if ink > best_ink:
+            best_top, best_ink = top, ink
+    return gray.crop((0, best_top, gray.width, best_top + window))
+
+def score_languages(text, candidates):
+    """Count the stopwords of each candidate language found in text"""
+    words = re.findall(r"[a-z]+", text.lower())
+    return {language: sum(1 for word in words if word in STOPWORDS[language]) for language in candidates}
+
+def detect_language(image, candidates=("eng", "ind"), min_confidence=0.6, min_hits=3):
+    """
+    Pick the language of a page with a quick pass over a small sample strip
+    
+    The strip is OCR'd with all candidate languages and each candidate is
+    scored by the stopwords found in the text. When the evidence is too weak
+    the combined candidates are returned, so full OCR never gets worse than
+    without detection.
+    
+    Args:
+        image: PIL image
+        candidates: Language codes to choose from
+        min_confidence: Minimum share of stopword hits the winner needs
+        min_hits: Minimum number of stopword hits overall
+    
+    Returns:
+        dict: Chosen "language", its "confidence", the per-language "scores"
+        and the time the pre-pass took in "ms"
+    """
+    start = time.perf_counter()
+    candidates = list(candidates)
+    combined = "+".join(candidates)
+    result = {"language": combined, "confidence": None, "scores": {}}
+    
+    if len(candidates) > 1 and all(language in STOPWORDS for language in candidates):
+        text = pytesseract.image_to_string(_sample_strip(image), lang=combined, config='--oem 1 --psm 6')
+        scores = score_languages(text, candidates)
+        hits = sum(scores.values())
+        best = max(candidates, key=lambda language: scores[language])
+        confidence = scores[best] / float(hits) if hits else 0.0
+        result["scores"] = scores
+        result["confidence"] = round(confidence, 3)
+        if hits >= min_hits and confidence >= min_confidence:
+            result["language"] = best
+    
+    result["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+def _image_to_string(image, language, config, preprocess=None, timings=None, details=None,
+                     detect=False):
+    """
+    Run tesseract on a PIL image, preprocessing it and detecting its language first if requested
+    
+    The chosen language and the detection result are stored in details.
+    """
+    if preprocess:
+        with METRICS.stage("preprocess"):
+            image, step_timings = preprocess_image(image, preprocess)
+        if timings is not None:
+            timings.extend(step_timings)
+    if detect:
+        with METRICS.stage("detect_language"):
+            detection = detect_language(image, language.split('+'))
+        language = detection["language"]
+        if details is not None:
+            details.update(language=language, language_detection=detection)
+    with METRICS.stage("tesseract"):
+        return pytesseract.image_to_string(image, lang=language, config=config)
+
+def _cached_ocr(key_buffer, language, config, run_ocr, preprocess=None, details=None, detect=False):
+    """
+    Run OCR through the result cache
+    
+    Args:
+        key_buffer: Bytes-like image content used for the cache key
+        language: Language code for OCR
+        config: Tesseract config string
+        run_ocr: Callable returning the extracted text, only called on a cache miss
+        preprocess: Normalized preprocessing options, part of the cache key
+        details: Result fields filled in by run_ocr, stored with the result
+        detect: Whether run_ocr detects the language, part of the cache key
+    
+    Returns:
+        dict: Dictionary containing the extracted text
+    """
+    # Return a previous result for the same bytes without launching tesseract
+    cache = get_cache()
+    options = {"preprocess": preprocess, "detect_language": True} if detect else preprocess
+    if cache:
+        with METRICS.stage("cache_lookup"):
+            cache_key = OCRCache.make_key(key_buffer, language, config, options)
+            cached = cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, cached=True)
+    
+    result = {
+        "success": True,
+        "text": run_ocr().strip(),
+        "language": language
+    }
+    result.update(details or {})
+    if cache:
+        with METRICS.stage("cache_store"):
+            cache.put(cache_key, result)
+    return result
+
+def _record_image(source, size):
+    """Record the dimensions and encoded size of a request's image, reading only its header"""
+    METRICS.inc("image_bytes_total", size)
+    if metrics.current() is None:
+        return
+    try:
+        with Image.open(source) as image:
+            metrics.record(image={"width": image.width, "height": image.height,
+                                  "format": image.format, "bytes": size})
+    except Exception:
+        metrics.record(image={"bytes": size})
+
+def process_image(image_data, language="eng+ind", config=DEFAULT_CONFIG, preprocess=None,
+                  detect=False):
     """
     Process an image using OCR to extract text
     
     Args:
-        image_data: Base64 encoded image data
+        image_data: Base64 encoded image data, or raw image bytes
         language: Language code for OCR (default: eng+ind for English and Indonesian)
+        config: Tesseract config string
+        preprocess: Optional preprocessing steps, see normalize_preprocess_options
+        detect: Pick one of the languages with detect_language before OCR
+    
+    Returns:
+        dict: Dictionary containing the extracted text, plus per-step
+        preprocessing timings when preprocessing ran
+    """
+    try:
+        preprocess = normalize_preprocess_options(preprocess)
+        timings = []
+        details = {}
+        
+        if isinstance(image_data, str):
+            # Decode the base64 image
+            with METRICS.stage("decode"):
+                image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
+        else:
+            image_bytes = image_data
+        _record_image(io.BytesIO(image_bytes), len(image_bytes))
         
+        if isinstance(image_data, str) or preprocess or detect:
+            def run_ocr():
+                # Open the image using PIL
+                with METRICS.stage("open"):
+                    image = Image.open(io.BytesIO(image_bytes))
+                    image.load()
+                
+                # Use pytesseract to extract text with specified language
+                return _image_to_string(image, language, config, preprocess, timings, details, detect)
+        else:
+            def run_ocr():
+                # Hand the encoded bytes straight to tesseract instead of decoding
+                # and re-encoding them with PIL
+                with _spill_to_file(image_bytes) as path, METRICS.stage("tesseract"):
+                    return pytesseract.image_to_string(path, lang=language, config=config)
+        
+        result = _cached_ocr(image_bytes, language, config, run_ocr, preprocess, details, detect)
+        if timings:
+            result["preprocess"] = timings
+        return result
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def process_image_file(image_path, language="eng+ind", config=DEFAULT_CONFIG, preprocess=None,
+                       detect=False):
+    """
+    Process an image file using OCR to extract text
+    
+    The file is memory-mapped for hashing and, unless preprocessing or
+    language detection is requested, its path is passed to tesseract as is, so the image is never
+    copied into this process.
+    
+    Args:
+        image_path: Path to an image file readable by tesseract
+        language: Language code for OCR (default: eng+ind for English and Indonesian)
+        config: Tesseract config string
+        preprocess: Optional preprocessing steps, see normalize_preprocess_options
+        detect: Pick one of the languages with detect_language before OCR
+    
     Returns:
         dict: Dictionary containing the extracted text
     """
     try:
-        # Decode the base64 image
-        image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
-        
-        # Open the image using PIL
-        image = Image.open(io.BytesIO(image_bytes))
+        preprocess = normalize_preprocess_options(preprocess)
+        timings = []
+        details = {}
         
-        # Configure OCR options for better accuracy
-        custom_config = r'--oem 1 --psm 3'
+        def run_ocr():
+            if preprocess or detect:
+                with Image.open(image_path) as image:
+                    return _image_to_string(image, language, config, preprocess, timings, details, detect)
+            with METRICS.stage("tesseract"):
+                return pytesseract.image_to_string(image_path, lang=language, config=config)
         
-        # Use pytesseract to extract text with specified language
-        extracted_text = pytesseract.image_to_string(
-            image, 
-            lang=language,
-            config=custom_config
+        _record_image(image_path, os.path.getsize(image_path))
+        with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            result = _cached_ocr(mapped, language, config, run_ocr, preprocess, details, detect)
+        if timings:
+            result["preprocess"] = timings
+        return result
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+# The batch process pool, kept warm between requests, and its (workers, threads_per_worker)
+_batch_pool = None
+_batch_pool_size = None
+_batch_pool_lock = threading.Lock()
+
+def _submit_batch(workers, threads_per_worker, fn, items):
+    """
+    Submit fn(item) for every item to the shared batch pool
+    
+    The pool is replaced when a batch asks for a different size; the old one
+    finishes the work it already has and then exits. Workers are started with
+    forkserver (or spawn where it is unavailable) rather than fork, because
+    serve mode forks from a process that is running other threads and may
+    hold their locks.
+    
+    Returns:
+        tuple: (pool, futures in item order)
+    """
+    global _batch_pool, _batch_pool_size
+    with _batch_pool_lock:
+        if _batch_pool is None or _batch_pool_size != (workers, threads_per_worker):
+            if _batch_pool is not None:
+                _batch_pool.shutdown(wait=False)
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _batch_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(method),
+                initializer=_init_batch_worker, initargs=(threads_per_worker,))
+            _batch_pool_size = (workers, threads_per_worker)
+        # Submit under the lock, so another batch can't shut the pool down in between
+        return _batch_pool, [_batch_pool.submit(fn, *item) for item in items]
+
+def _discard_batch_pool(pool):
+    """Forget a pool whose worker died, so the next batch starts a fresh one"""
+    global _batch_pool, _batch_pool_size
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = _batch_pool_size = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _init_batch_worker(threads_per_worker):
+    """Limit the threads each tesseract instance started by this worker may use"""
+    os.environ['OMP_THREAD_LIMIT'] = str(threads_per_worker)
+
+def _process_batch_item(item, language, preprocess=None, detect=False):
+    """Process one batch item, which is either base64 data or {"image"/"image_path", "language", "preprocess"}"""
+    if isinstance(item, dict):
+        language = item.get("language", language)
+        preprocess = item.get("preprocess", preprocess)
+        detect = item.get("detect_language", detect)
+        if item.get("image_path"):
+            return process_image_file(item["image_path"], language, preprocess=preprocess, detect=detect)
+        item = item.get("image")
+    if not item:
+        return {
+            "success": False,
+            "error": "No image data provided"
+        }
+    return process_image(item, language, preprocess=preprocess, detect=detect)
+
+def iter_batch(images, language="eng+ind", workers=None, threads_per_worker=1, preprocess=None,
+               detect=False):
+    """
+    Process a list of images across a process pool
+    
+    The pool is shared with later batches that ask for the same workers and
+    threads_per_worker, so its worker processes only start once. Both are
+    capped at the CPU count.
+    
+    Args:
+        images: List of base64 encoded images or {"image"/"image_path", "language"} dicts
+        language: Default language code for items that don't specify one
+        workers: Number of worker processes (default: CPU count / threads_per_worker)
+        threads_per_worker: Threads each tesseract instance may use
+        preprocess: Default preprocessing steps for items that don't specify any
+        detect: Default for detecting each item's language before OCR
+    
+    Yields:
+        tuple: (index, result) as soon as each image finishes, where result has
+        the same shape process_image returns
+    """
+    cpus = os.cpu_count() or 1
+    threads_per_worker = min(max(1, int(threads_per_worker or 1)), cpus)
+    workers = min(max(1, int(workers or cpus // threads_per_worker)), cpus)
+    
+    pool, submitted = _submit_batch(workers, threads_per_worker, _process_batch_item,
+                                    [(item, language, preprocess, detect) for item in images])
+    futures = {future: index for index, future in enumerate(submitted)}
+    try:
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                _discard_batch_pool(pool)
+                result = {"success": False, "error": str(e)}
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            yield futures[future], result
+    finally:
+        # Don't leave the rest of an abandoned batch queued on the shared pool
+        for future in futures:
+            future.cancel()
+
+def process_batch(images, language="eng+ind", workers=None, threads_per_worker=1, preprocess=None,
+                  detect=False):
+    """
+    Process a list of images across a process pool
+    
+    Returns:
+        list: One process_image result per input image, in input order
+    """
+    results = [None] * len(images)
+    for index, result in iter_batch(images, language, workers, threads_per_worker, preprocess, detect):
+        results[index] = result
+    return results
+
+def _render_pdf_page(path, page_number, dpi):
+    """Rasterize a single PDF page with pdftoppm"""
+    output = subprocess.run(
+        [PDFTOPPM_CMD, '-f', str(page_number), '-l', str(page_number), '-r', str(dpi), '-png', path, '-'],
+        check=True, capture_output=True
+    ).stdout
+    return Image.open(io.BytesIO(output))
+
+def _pdf_page_count(path):
+    """Read the number of pages of a PDF with pdfinfo"""
+    output = subprocess.run([PDFINFO_CMD, path], check=True, capture_output=True, text=True).stdout
+    for line in output.splitlines():
+        if line.startswith('Pages:'):
+            return int(line.split(':', 1)[1])
+    raise ValueError("Could not determine the PDF page count")
+
+def _iter_document_pages(path, dpi):
+    """
+    Lazily iterate the pages of a document
+    
+    Yields:
+        tuple: (page_number, load_page) where load_page returns the page as a
+        PIL image. TIFF frames are decoded here, one at a time; PDF pages are
+        rendered when load_page is called.
+    """
+    with open(path, 'rb') as f:
+        is_pdf = f.read(5) == b'%PDF-'
+    
+    if is_pdf:
+        if not PDFTOPPM_CMD or not PDFINFO_CMD:
+            raise ValueError("PDF documents require poppler's pdftoppm and pdfinfo")
+        for page_number in range(1, _pdf_page_count(path) + 1):
+            yield page_number, lambda page_number=page_number: _render_pdf_page(path, page_number, dpi)
+        return
+    
+    with Image.open(path) as image:
+        for page_number, frame in enumerate(ImageSequence.Iterator(image), start=1):
+            page = frame.copy()
+            yield page_number, lambda page=page: page
+
+def _process_page(page_number, load_page, language, config, preprocess=None, extra=None, threads=None):
+    """OCR a single document page, with at most threads tesseract threads"""
+    try:
+        timings = []
+        with tesseract_thread_limit(threads):
+            text = _image_to_string(load_page(), language, config, preprocess, timings)
+        result = {"success": True, "page": page_number, "text": text.strip()}
+        result.update(extra or {})
+        if timings:
+            result["preprocess"] = timings
+        return result
+    except Exception as e:
+        return {"success": False, "page": page_number, "error": str(e)}
+
+def iter_document(path, language="eng+ind", config=DEFAULT_CONFIG, workers=None,
+                  max_pages_in_flight=None, dpi=300, preprocess=None, detect=False):
+    """
+    OCR the pages of a multi-page TIFF or PDF in parallel
+    
+    Pages are decoded lazily and only once a slot is free, so at most
+    max_pages_in_flight of them are held in memory at once and arbitrarily
+    long documents run in bounded memory. Unless OMP_THREAD_LIMIT is already
+    set, each tesseract instance is limited to its share of the CPUs.
+    
+    Args:
+        path: Path to a TIFF, PDF or any other image file
+        language: Language code for OCR (default: eng+ind for English and Indonesian)
+        config: Tesseract config string
+        workers: Number of pages OCR'd concurrently (default: CPU count)
+        max_pages_in_flight: Maximum number of decoded pages (default: 2 * workers)
+        dpi: Resolution PDF pages are rendered at
+        preprocess: Optional preprocessing steps applied to every page
+        detect: Detect the language on the first page and use it for all pages
+    
+    Yields:
+        dict: Per-page result with "page" (1-based) and "text" or "error", as
+        soon as each page finishes. With detect, the first page also carries
+        the "language_detection" result.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pages_in_flight = max(1, max_pages_in_flight or workers * 2)
+    preprocess = normalize_preprocess_options(preprocess)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        pages = _iter_document_pages(path, dpi)
+        while True:
+            # Wait for a free slot before the next page is decoded
+            if len(in_flight) >= max_pages_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            page_number, load_page = next(pages, (None, None))
+            if page_number is None:
+                break
+            extra = None
+            if detect and page_number == 1:
+                page = load_page()
+                detection = detect_language(page, language.split('+'))
+                language = detection["language"]
+                extra = {"language_detection": detection}
+                load_page = lambda page=page: page
+            in_flight.add(pool.submit(_process_page, page_number, load_page, language, config, preprocess, extra,
+                                      threads))
+        for future in as_completed(in_flight):
+            yield future.result()
+
+def process_document(path, language="eng+ind", config=DEFAULT_CONFIG, workers=None,
+                     max_pages_in_flight=None, dpi=300, preprocess=None, detect=False):
+    """
+    OCR every page of a document
+    
+    Returns:
+        dict: Per-page results in page order and the joined text of all pages
+    """
+    try:
+        pages = sorted(iter_document(path, language, config, workers, max_pages_in_flight, dpi, preprocess, detect),
+                       key=lambda page: page["page"])
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    
+    result = {
+        "success": True,
+        "text": "\n\n".join(page["text"] for page in pages if page["success"]),
+        "pages": pages,
+        "page_count": len(pages),
+        "language": language
+    }
+    if pages and "language_detection" in pages[0]:
+        result["language"] = pages[0]["language_detection"]["language"]
+        result["language_detection"] = pages[0]["language_detection"]
+    return result
+
+def _handle_document_request(data, emit, payload, language):
+    """Handle a document request for a file path, binary frame or base64 image"""
+    options = {
+        "workers": data.get("workers"),
+        "max_pages_in_flight": data.get("max_pages_in_flight"),
+        "dpi": data.get("dpi", 300),
+        "preprocess": data.get("preprocess"),
+        "detect": bool(data.get("detect_language"))
+    }
+    
+    if payload is None and not data.get("image_path"):
+        image_data = data.get("image")
+        if not image_data:
+            return {
+                "success": False,
+                "error": "No image data provided"
+            }
+        payload = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
+    
+    if payload is not None:
+        with _spill_to_file(payload) as path:
+            return _handle_document_request(dict(data, image_path=path, image=None), emit, None, language)
+    
+    path = data["image_path"]
+    if not (data.get("stream") and emit):
+        return process_document(path, language, **options)
+    
+    page_count = 0
+    try:
+        for page in iter_document(path, language, **options):
+            page_count += 1
+            emit(page)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    return {"success": True, "done": True, "page_count": page_count}
+
+def _split_profile(profile, min_gap, min_ink=0):
+    """Return (start, end) runs of the profile with ink, merging runs separated by less than min_gap"""
+    runs = []
+    start = None
+    for index, ink in enumerate(profile):
+        if ink > min_ink:
+            if start is None:
+                start = index
+            end = index + 1
+        elif start is not None and index - end >= min_gap:
+            runs.append((start, end))
+            start = None
+    if start is not None:
+        runs.append((start, end))
+    return runs
+
+def detect_text_blocks(gray):
+    """
+    Find text blocks with a two-level XY cut on the page's ink profiles
+    
+    Rows are split on vertical gaps of at least one text line and each band is
+    split on horizontal gaps of at least two text lines, so paragraphs and
+    columns become separate blocks while blank areas are left out entirely.
+    
+    Args:
+        gray: Grayscale PIL image
+    
+    Returns:
+        tuple: (list of (left, top, right, bottom) boxes in reading order,
+        estimated text line height)
+    """
+    mask = _ink_mask(gray)
+    line_height = _estimate_text_height(gray) or 20
+    blocks = []
+    rows = _row_profile(mask)
+    for top, bottom in _split_profile(rows, line_height, max(rows) * 0.02):
+        band = mask.crop((0, top, mask.width, bottom))
+        columns = list(band.resize((band.width, 1), Image.BOX).getdata())
+        for left, right in _split_profile(columns, line_height * 2, max(columns) * 0.02):
+            blocks.append((left, top, right, bottom))
+    return blocks, line_height
+
+def _group_words(data, offset_x, offset_y):
+    """Group image_to_data output into lines of words with page coordinates"""
+    lines = {}
+    for index, text in enumerate(data["text"]):
+        confidence = float(data["conf"][index])
+        if not text.strip() or confidence < 0:
+            continue
+        key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+        lines.setdefault(key, []).append({
+            "text": text,
+            "confidence": confidence,
+            "bbox": {
+                "x": data["left"][index] + offset_x,
+                "y": data["top"][index] + offset_y,
+                "width": data["width"][index],
+                "height": data["height"][index]
+            }
+        })
+    
+    result = []
+    for key in sorted(lines):
+        words = lines[key]
+        left = min(word["bbox"]["x"] for word in words)
+        top = min(word["bbox"]["y"] for word in words)
+        right = max(word["bbox"]["x"] + word["bbox"]["width"] for word in words)
+        bottom = max(word["bbox"]["y"] + word["bbox"]["height"] for word in words)
+        result.append({
+            "text": " ".join(word["text"] for word in words),
+            "confidence": round(sum(word["confidence"] for word in words) / len(words), 2),
+            "bbox": {"x": left, "y": top, "width": right - left, "height": bottom - top},
+            "words": words
+        })
+    return result
+
+def _process_region(image, region, language, preprocess=None):
+    """OCR one region of an image and return it as a block of lines and words"""
+    x, y = region["x"], region["y"]
+    crop = image.crop((x, y, x + region["width"], y + region["height"]))
+    block = {"bbox": {"x": x, "y": y, "width": region["width"], "height": region["height"]},
+             "psm": region["psm"]}
+    if region.get("name"):
+        block["name"] = region["name"]
+    
+    # Skip regions without any contrast instead of running tesseract on them
+    low, high = crop.convert('L').getextrema()
+    if high - low < 32:
+        return dict(block, success=True, skipped=True, text="", confidence=None, lines=[])
+    
+    try:
+        if preprocess:
+            crop, _ = preprocess_image(crop, preprocess)
+        data = pytesseract.image_to_data(crop, lang=language, config=f'--oem 1 --psm {region["psm"]}',
+                                         output_type=pytesseract.Output.DICT)
+        lines = _group_words(data, x, y)
+        words = [word for line in lines for word in line["words"]]
+        return dict(
+            block,
+            success=True,
+            text="\n".join(line["text"] for line in lines),
+            confidence=round(sum(word["confidence"] for word in words) / len(words), 2) if words else None,
+            lines=lines
         )
+    except Exception as e:
+        return dict(block, success=False, error=str(e))
+
+def process_layout(image, language="eng+ind", regions=None, workers=None, preprocess=None):
+    """
+    OCR only the text regions of an image and return structured results
+    
+    Args:
+        image: PIL image
+        language: Language code for OCR (default: eng+ind for English and Indonesian)
+        regions: Optional list of {"x", "y", "width", "height", "psm", "name"}
+            regions of interest, where psm is an integer from 0 to 13. When
+            omitted, text blocks are detected.
+        workers: Number of regions OCR'd concurrently (default: CPU count)
+        preprocess: Optional grayscale/binarize steps applied to each region
+    
+    Returns:
+        dict: Blocks with lines, words, bounding boxes and confidences
+    """
+    try:
+        preprocess = normalize_preprocess_options(preprocess)
+        if preprocess and set(preprocess["steps"]) - {"grayscale", "binarize"}:
+            raise ValueError("Only grayscale and binarize preprocessing keep region coordinates intact")
+        
+        gray = image.convert('L')
+        if regions:
+            line_height = _estimate_text_height(gray) or 20
+            regions = [dict(region) for region in regions]
+        else:
+            boxes, line_height = detect_text_blocks(gray)
+            padding = 4
+            regions = []
+            for left, top, right, bottom in boxes:
+                left, top = max(0, left - padding), max(0, top - padding)
+                right, bottom = min(image.width, right + padding), min(image.height, bottom + padding)
+                regions.append({"x": left, "y": top, "width": right - left, "height": bottom - top})
+        
+        for region in regions:
+            # A single line reads best with --psm 7, anything taller as a uniform block
+            region.setdefault("psm", 7 if region["height"] < line_height * 1.8 else 6)
+            # psm is pasted into the tesseract config, so only accept its valid values
+            if isinstance(region["psm"], bool) or not isinstance(region["psm"], int) or not 0 <= region["psm"] <= 13:
+                raise ValueError(f"Invalid psm {region['psm']!r}, expected an integer from 0 to 13")
+        
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            blocks = list(pool.map(lambda region: _process_region(image, region, language, preprocess), regions))
         
         return {
             "success": True,
-            "text": extracted_text.strip(),
+            "text": "\n\n".join(block["text"] for block in blocks if block.get("text")),
+            "blocks": blocks,
+            "width": image.width,
+            "height": image.height,
             "language": language
         }
     except Exception as e:
@@ -52,24 +1099,162 @@ def process_image(image_data, language="eng+ind"):
             "error": str(e)
         }
 
+def _open_request_image(data, payload):
+    """Open the image of a request, given as a binary frame, a file path or base64 data"""
+    if payload is not None:
+        return Image.open(io.BytesIO(payload))
+    if data.get("image_path"):
+        return Image.open(data["image_path"])
+    image_data = data.get("image")
+    if not image_data:
+        return None
+    return Image.open(io.BytesIO(base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)))
+
+def _handle_layout_request(data, payload, language, preprocess):
+    """Handle a layout request for a file path, binary frame or base64 image"""
+    try:
+        image = _open_request_image(data, payload)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    if image is None:
+        return {
+            "success": False,
+            "error": "No image data provided"
+        }
+    with image:
+        return process_layout(image, language, data.get("regions"), data.get("workers"), preprocess)
+
+def handle_request(data, emit=None, payload=None):
+    """
+    Handle a single OCR request
+    
+    Args:
+        data: Parsed JSON request with either "image", "image_path" or a batch
+            of "images", and an optional "language". Requests with
+            "operation": "document" OCR every page of a TIFF or PDF, and
+            "operation": "layout" returns blocks, lines and words with
+            bounding boxes. An optional "preprocess" selects preprocessing steps
+            and "detect_language" picks one of the languages before OCR.
+            With "metrics": true the result includes per-stage timings and
+            image details, and "operation": "metrics" returns the Prometheus
+            metrics collected when METRICS_ENABLED is set.
+        emit: Optional callback used to stream batch and document results
+            when the request sets "stream"
+        payload: Raw image bytes sent as a binary frame after the request
+    
+    Returns:
+        dict: Result of process_image, the batch, document or layout results, or an error
+    """
+    operation = data.get("operation") or ("batch" if "images" in data else "image")
+    with metrics.request(bool(data.get("metrics"))) as recorder:
+        started = time.perf_counter()
+        result = _route_request(data, emit, payload)
+        METRICS.inc("requests_total", operation=operation, status="success" if result.get("success") else "error")
+        METRICS.observe("request_duration_seconds", time.perf_counter() - started, operation=operation)
+        if recorder:
+            result = dict(result, metrics=recorder.summary())
+    return result
+
+def _route_request(data, emit=None, payload=None):
+    """Dispatch a request for handle_request"""
+    language = data.get("language", "eng+ind")  # Default to both English and Indonesian
+    preprocess = data.get("preprocess")
+    detect = bool(data.get("detect_language"))
+    
+    if data.get("operation") == "document":
+        return _handle_document_request(data, emit, payload, language)
+    
+    if data.get("operation") == "layout":
+        return _handle_layout_request(data, payload, language, preprocess)
+    
+    if data.get("operation") == "metrics":
+        if not METRICS.enabled:
+            return {"success": False, "error": "Metrics are disabled, set METRICS_ENABLED=true"}
+        return {"success": True, "data": METRICS.render()}
+    
+    if data.get("operation") == "cache_stats":
+        cache = get_cache()
+        if not cache:
+            return {"success": False, "error": "OCR cache is disabled"}
+        return {"success": True, "data": cache.stats()}
+    
+    if "images" in data:
+        images = data.get("images") or []
+        workers = data.get("workers")
+        threads_per_worker = data.get("threads_per_worker", 1)
+        
+        if data.get("stream") and emit:
+            for index, result in iter_batch(images, language, workers, threads_per_worker, preprocess, detect):
+                emit(dict(result, index=index))
+            return {"success": True, "done": True, "count": len(images)}
+        
+        return {
+            "success": True,
+            "results": process_batch(images, language, workers, threads_per_worker, preprocess, detect)
+        }
+    
+    if payload is not None:
+        return process_image(payload, language, preprocess=preprocess, detect=detect)
+    
+    if data.get("image_path"):
+        return process_image_file(data["image_path"], language, preprocess=preprocess, detect=detect)
+    
+    image_data = data.get("image")
+    if not image_data:
+        return {
+            "success": False,
+            "error": "No image data provided"
+        }
+    return process_image(image_data, language, preprocess=preprocess, detect=detect)
+
+def serve(workers=None):
+    """
+    Serve OCR requests as newline-delimited JSON over stdin/stdout
+    
+    Each input line is a request object with an optional "id" which is echoed
+    back on the matching response line. A request with a "length" field is
+    followed by exactly that many bytes of raw image data.
+    
+    Args:
+        workers: Number of concurrent OCR workers (default: CPU count)
+    """
+    jsonl_server.serve(lambda data, emit, payload: handle_request(data, emit=emit, payload=payload),
+                       id_field="id", workers=workers, registry=METRICS, frames=True)
+
 if __name__ == "__main__":
-    # Read input from stdin
-    input_data = sys.stdin.read()
+    parser = argparse.ArgumentParser(description="OCR service")
+    parser.add_argument("--serve", action="store_true", help="Serve newline-delimited JSON requests until stdin closes")
+    parser.add_argument("--workers", type=int, default=None, help="Number of concurrent OCR workers in serve mode")
+    parser.add_argument("--binary", action="store_true", help="Read a JSON header line followed by raw image bytes")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Threads each tesseract instance may use")
+    args = parser.parse_args()
+    
+    if args.threads_per_worker:
+        _init_batch_worker(args.threads_per_worker)
+    
+    if args.serve:
+        serve(args.workers)
+        sys.exit(0)
     
     try:
-        # Parse the JSON input
-        data = json.loads(input_data)
-        image_data = data.get("image")
-        language = data.get("language", "eng+ind")  # Default to both English and Indonesian
-        
-        if not image_data:
-            result = {
-                "success": False,
-                "error": "No image data provided"
-            }
+        payload = None
+        if args.binary:
+            # Read the JSON header line, then the raw image bytes
+            data = json.loads(sys.stdin.buffer.readline() or b"{}")
+            if data.get("length") is not None:
+                payload = read_frame(sys.stdin.buffer, data["length"])
+                if payload is None:
+                    raise ValueError("Truncated image frame")
+            else:
+                payload = sys.stdin.buffer.read()
         else:
-            result = process_image(image_data, language)
-            
+            # Read input from stdin and parse the JSON input
+            data = json.loads(sys.stdin.read())
+        result = handle_request(data, emit=lambda partial: print(json.dumps(partial), flush=True), payload=payload)
+        
         # Output the result as JSON
         print(json.dumps(result))
     except Exception as e:
@@ -0,0 +1,196 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+import argparse
+import threading
+
+class SearchIndex:
+    """
+    Local full-text index of image names and extracted text, stored in SQLite FTS5
+    
+    The FTS rowid is the image id, so results can be joined back to the images
+    table. Matches are ranked with BM25, with the name weighted above the text.
+    """
+    
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5("
+                "name, extracted_text, tokenize='unicode61 remove_diacritics 2')"
+            )
+    
+    def add_many(self, rows):
+        """Index or re-index (id, name, extracted_text) rows"""
+        rows = [(int(id), name or "", extracted_text or "") for id, name, extracted_text in rows]
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM images_fts WHERE rowid = ?", [(row[0],) for row in rows])
+            self.connection.executemany(
+                "INSERT INTO images_fts (rowid, name, extracted_text) VALUES (?, ?, ?)", rows
+            )
+    
+    def add(self, id, name, extracted_text):
+        """Index or re-index one image"""
+        self.add_many([(id, name, extracted_text)])
+    
+    def update(self, id, name=None, extracted_text=None):
+        """Update the indexed fields that are given, keeping the others"""
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT name, extracted_text FROM images_fts WHERE rowid = ?", (int(id),)
+            ).fetchone()
+            current_name, current_text = row if row else ("", "")
+            self.connection.execute("DELETE FROM images_fts WHERE rowid = ?", (int(id),))
+            self.connection.execute(
+                "INSERT INTO images_fts (rowid, name, extracted_text) VALUES (?, ?, ?)",
+                (int(id), name or current_name, extracted_text or current_text)
+            )
+    
+    def delete_many(self, ids):
+        """Remove images from the index"""
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM images_fts WHERE rowid = ?", [(int(id),) for id in ids])
+    
+    def delete(self, id):
+        """Remove one image from the index"""
+        self.delete_many([id])
+    
+    def clear(self):
+        """Remove every image from the index"""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM images_fts")
+    
+    @staticmethod
+    def to_match_query(search):
+        """Turn free text into an FTS5 query that matches all words as prefixes"""
+        words = re.findall(r"\w+", search.lower())
+        return " ".join(f'"{word}"*' for word in words)
+    
+    def search(self, search, limit=None, offset=0, count=False):
+        """
+        Search the index
+        
+        Args:
+            search: Free text; every word must match the start of an indexed word
+            limit: Maximum number of results (default: all)
+            offset: Number of results to skip
+            count: Also return the total number of matches
+        
+        Returns:
+            dict: "ids" and "ranks" in rank order (lower rank is better), plus
+            "count" when requested
+        """
+        query = self.to_match_query(search)
+        if not query:
+            return {"ids": [], "ranks": [], "count": 0} if count else {"ids": [], "ranks": []}
+        
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT rowid, bm25(images_fts, 2.0, 1.0) AS rank FROM images_fts "
+                "WHERE images_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+                (query, -1 if limit is None else int(limit), int(offset or 0))
+            ).fetchall()
+            result = {"ids": [row[0] for row in rows], "ranks": [row[1] for row in rows]}
+            if count:
+                result["count"] = self.connection.execute(
+                    "SELECT COUNT(*) FROM images_fts WHERE images_fts MATCH ?", (query,)
+                ).fetchone()[0]
+        return result
+
+def benchmark(documents=100000, queries=50, seed=42):
+    """
+    Compare ranked FTS5 search with a leading-wildcard LIKE scan
+    
+    Builds a synthetic corpus of OCR-like documents in one SQLite database and
+    times the same queries against a plain table with LIKE '%term%' (what
+    get_images' ILIKE '*term*' filter does in PostgreSQL) and against FTS5.
+    Both are timed for a newest-first 20-result page and for every match, so
+    each speedup compares equal result sizes.
+    """
+    random.seed(seed)
+    vocabulary = ["".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.randint(3, 10)))
+                  for _ in range(20000)]
+    # Zipf-like word frequencies, as in real text
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    
+    directory = tempfile.mkdtemp(prefix="search_benchmark_")
+    index = SearchIndex(os.path.join(directory, "index.sqlite3"))
+    connection = index.connection
+    connection.execute("CREATE TABLE images (id INTEGER PRIMARY KEY, name TEXT, extracted_text TEXT)")
+    
+    start = time.perf_counter()
+    batch = []
+    for id in range(1, documents + 1):
+        text = " ".join(random.choices(vocabulary, weights, k=random.randint(50, 300)))
+        batch.append((id, f"scan-{id}.jpg", text))
+        if len(batch) == 5000 or id == documents:
+            connection.executemany("INSERT INTO images VALUES (?, ?, ?)", batch)
+            index.add_many(batch)
+            batch = []
+    connection.commit()
+    build_seconds = time.perf_counter() - start
+    
+    # Mid-frequency words, so queries return a realistic number of matches
+    terms = random.sample(vocabulary[100:2000], queries)
+    
+    def timed(run):
+        timings = []
+        for term in terms:
+            started = time.perf_counter()
+            run(term)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {"p50_ms": round(timings[len(timings) // 2], 3),
+                "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3)}
+    
+    def like(term, limit):
+        return connection.execute(
+            "SELECT id FROM images WHERE name LIKE ? OR extracted_text LIKE ? ORDER BY id DESC LIMIT ?",
+            (f"%{term}%", f"%{term}%", limit)
+        ).fetchall()
+    
+    like_page = timed(lambda term: like(term, 20))
+    fts_page = timed(lambda term: index.search(term, limit=20))
+    like_all = timed(lambda term: like(term, -1))
+    fts_all = timed(lambda term: index.search(term))
+    
+    connection.close()
+    shutil.rmtree(directory)
+    return {
+        "documents": documents,
+        "queries": queries,
+        "build_seconds": round(build_seconds, 2),
+        "page_of_20": {
+            "like_scan": like_page,
+            "fts5_ranked": fts_page,
+            "speedup_p50": round(like_page["p50_ms"] / fts_page["p50_ms"], 1) if fts_page["p50_ms"] else None
+        },
+        "all_matches": {
+            "like_scan": like_all,
+            "fts5_ranked": fts_all,
+            "speedup_p50": round(like_all["p50_ms"] / fts_all["p50_ms"], 1) if fts_all["p50_ms"] else None
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local full-text search index")
+    parser.add_argument("--benchmark", action="store_true", help="Compare FTS5 with LIKE scans on a synthetic corpus")
+    parser.add_argument("--documents", type=int, default=100000, help="Number of synthetic documents")
+    parser.add_argument("--queries", type=int, default=50, help="Number of timed queries")
+    args = parser.parse_args()
+    
+    if not args.benchmark:
+        parser.print_help()
+        sys.exit(1)
+    
+    print(json.dumps(benchmark(args.documents, args.queries), indent=2))
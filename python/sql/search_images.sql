@@ -0,0 +1,88 @@
+-- Full-text search for the images table, used by db_operations.py when
+-- SUPABASE_SEARCH_RPC=search_images is set.
+-- The 'simple' configuration is used because documents mix English and Indonesian.
+-- The tsvector lives in its own table, so select=* on images never returns it.
+
+create table if not exists image_search (
+  image_id bigint primary key references images (id) on delete cascade,
+  fts tsvector not null
+);
+
+create index if not exists image_search_fts_idx on image_search using gin (fts);
+
+-- Only the trigger below writes search vectors, and a row is visible only to
+-- those who can see its image, so the anon key can't read or alter the index
+alter table image_search enable row level security;
+revoke insert, update, delete, truncate on image_search from anon, authenticated;
+
+drop policy if exists image_search_read on image_search;
+create policy image_search_read on image_search
+  for select
+  using (exists (select 1 from images where images.id = image_search.image_id));
+
+create or replace function image_search_refresh()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  insert into image_search (image_id, fts)
+  values (
+    new.id,
+    setweight(to_tsvector('simple', coalesce(new.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(new.extracted_text, '')), 'B')
+  )
+  on conflict (image_id) do update set fts = excluded.fts;
+  return new;
+end;
+$$;
+
+drop trigger if exists image_search_refresh on images;
+create trigger image_search_refresh
+  after insert or update of name, extracted_text on images
+  for each row execute function image_search_refresh();
+
+-- Index the rows that already exist
+insert into image_search (image_id, fts)
+select
+  id,
+  setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+  setweight(to_tsvector('simple', coalesce(extracted_text, '')), 'B')
+from images
+on conflict (image_id) do update set fts = excluded.fts;
+
+-- Every word of the query must match the start of a word, like the local FTS5 index
+create or replace function image_search_query(query text)
+returns tsquery
+language sql
+immutable
+as $$
+  select to_tsquery('simple', coalesce(string_agg(quote_literal(word[1]) || ':*', ' & '), ''))
+  from regexp_matches(lower(query), '\w+', 'g') as word
+$$;
+
+create or replace function search_images(query text, max_rows integer default null, skip integer default 0)
+returns setof images
+language sql
+stable
+as $$
+  select images.*
+  from images
+  join image_search on image_search.image_id = images.id
+  where image_search.fts @@ image_search_query(query)
+  order by ts_rank(image_search.fts, image_search_query(query)) desc, images.created_at desc, images.id desc
+  limit max_rows
+  offset skip
+$$;
+
+-- Total number of matches, called by db_operations.py when a search asks for a count
+create or replace function search_images_count(query text)
+returns bigint
+language sql
+stable
+as $$
+  select count(*)
+  from image_search
+  where fts @@ image_search_query(query)
+$$;